@@ -1,6 +1,6 @@
 # app3.py
 from __future__ import annotations
-import socket, threading, queue, time, csv, os, re, json, calendar
+import threading, queue, time, csv, os, re, json, calendar
 from datetime import datetime, timedelta, timezone, date
 try:
     from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
@@ -12,12 +12,18 @@ except Exception:
     TZ = timezone(timedelta(hours=7))
 
 from api_clients import SlidingRoofClient, LimitStatusClient, RoofResult
+from laser_client import CommandWorker, LaserClient, LinkStats, EV_MODE, EV_READY, SAMPLE_CMDS, STATE_CONNECTED, STATE_RECONNECTING, reply_head
+from laser_pool import DEFAULT_DEVICE, DeviceConfig, LaserPool
+from laser_replay import SessionRecorder
+from live_chart import LIVE_PLOTS, export_png, make_live_plot
+from live_series import CHART_TIERS, StepSeries, TieredSeries
+from log_pane import LogPane
+from telemetry import STATE_FIRE, STATE_IDLE, STATE_REST, SamplingPolicy, TelemetrySampler
+from telemetry_sink import TELEMETRY_HEADER, CsvSink, tail_rows
 from tutorial_overlay import TutorialOverlay
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
 
 from tkinter import messagebox
 import re  # ใช้ parse ค่าตัวเลขจากคำตอบ LTEMF?
@@ -31,114 +37,10 @@ SETTINGS_DIR = "setting"
 os.makedirs(LOG_DIR, exist_ok=True)
 os.makedirs(SETTINGS_DIR, exist_ok=True)
 CONFIG_FILE = os.path.join(SETTINGS_DIR, "laser_scheduler_settings.json")
-
-
-# ---------------- Laser Client ----------------
-class LaserClient:
-    def try_send_cmd(self, cmd: str, call_timeout: float | None = None) -> str | None:
-        if not self.sock:
-            raise RuntimeError("Not connected")
-
-        # พยายามจับล็อกแบบไม่บล็อก
-        locked = self.lock.acquire(blocking=False)
-        if not locked:
-            return None  # BUSY: มีคนใช้อยู่ (เช่น Telemetry/คำสั่งอื่น)
-
-        try:
-            # ตั้ง timeout เฉพาะครั้งนี้ (สั้นๆ เพื่อลดเวลาถือครองล็อก)
-            s = self.sock
-            orig_to = self.timeout
-            if call_timeout is not None:
-                s.settimeout(call_timeout)
-            else:
-                s.settimeout(orig_to)
-
-            s.sendall((cmd.strip() + "\n").encode())
-            chunks = []
-            try:
-                while True:
-                    b = s.recv(1024)
-                    if not b:
-                        break
-                    chunks.append(b)
-                    if b.endswith(b"\n"):
-                        break
-            except socket.timeout:
-                # ปล่อยตามมีตามเกิด: ถ้าหมดเวลาจะคืนสิ่งที่อ่านได้ (ถ้ามี)
-                pass
-
-            # คืนค่า และกู้คืน timeout เดิม
-            return b"".join(chunks).decode(errors="ignore").strip()
-        finally:
-            try:
-                # กู้คืน timeout เดิม (กัน side effect)
-                if call_timeout is not None and self.sock:
-                    self.sock.settimeout(self.timeout)
-            except Exception:
-                pass
-            self.lock.release()
-
-    def get_status(self):
-        # ใช้ non-blocking + timeout สั้น
-        resp = self.try_send_cmd("$STATUS ?", call_timeout=0.4)
-        if not resp:
-            return None  # กลับ None เพื่อให้ผู้เรียกตัดสินใจว่าจะคงค่าเดิมไว้
-        parts = resp.split()
-        if len(parts) < 2:
-            return None
-        try:
-            state = int(parts[1][0:2], 16)
-        except ValueError:
-            return None
-
-        if state & 0b10000000:
-            mode = "FIRE"
-        elif state & 0b01000000:
-            mode = "STANDBY"
-        else:
-            mode = "STOP"
-
-        ready = "Not Ready" if state & 0b00000001 else "Ready"
-        return f"{mode} ({ready})"
-
-
-    def __init__(self, host: str, port: int, timeout: float = 3.0):
-        self.host = host
-        self.port = port
-        self.timeout = timeout
-        self.sock: socket.socket | None = None
-        self.lock = threading.Lock()
-
-    def connect(self):
-        self.close()
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(self.timeout)
-        s.connect((self.host, self.port))
-        self.sock = s
-
-    def close(self):
-        with self.lock:
-            if self.sock:
-                try: self.sock.close()
-                except Exception: pass
-                self.sock = None
-
-    def send_cmd(self, cmd: str) -> str:
-        with self.lock:
-            if not self.sock:
-                raise RuntimeError("Not connected")
-            self.sock.sendall((cmd.strip() + "\n").encode())
-            self.sock.settimeout(self.timeout)
-            chunks = []
-            try:
-                while True:
-                    b = self.sock.recv(1024)
-                    if not b: break
-                    chunks.append(b)
-                    if b.endswith(b"\n"): break
-            except socket.timeout:
-                pass
-            return b"".join(chunks).decode(errors="ignore").strip()
+TIMING_HEADER = ["Date", "Time", "Timezone", "Cycle", "CMD", "Lateness_ms", "Ack_ms", "Reply"]
+CHART_WINDOW_SEC = max(w for _, _, w in CHART_TIERS)  # ช่วงยาวสุดที่กราฟ live เก็บไว้ (24 ชม.)
+# ไฟล์ telemetry ของเลเซอร์หลักที่ใช้เติมกราฟตอนเปิดโปรแกรม (รายวัน / Timer / Manual)
+CHART_SEED_RE = re.compile(r"^telemetry_(\d{8}|sched_P\d+_\d{8}_\d{6}|manual_\d{8}_\d{6})(_\d+)?\.csv$")
 
 
 # ---------------- One-shot Scheduler (single occurrence) ----------------
@@ -165,6 +67,8 @@ class FireRestScheduler(threading.Thread):
         self.on_tick = on_tick
         self.stop_event = stop_event
         self.on_done = on_done
+        # เวลา (time.monotonic) ที่ช่วง FIRE/REST ปัจจุบันควรเริ่มจริง ใช้กับ LaserClient.send_at
+        self.phase_at = time.monotonic()
 
     @staticmethod
     def count_fire_cycles(start_dt: datetime, end_dt: datetime, fire_td: timedelta, rest_td: timedelta) -> int:
@@ -176,40 +80,45 @@ class FireRestScheduler(threading.Thread):
         leftover = total - (cycle * full)
         return full + (1 if leftover >= fire_td else 0)
 
+    def _wait_until(self, until: datetime) -> None:
+        # tick ทุก 0.2 s แต่ตื่นตรงเวลา until (ไม่เลยไปสูงสุด 0.2 s)
+        while not self.stop_event.is_set():
+            remaining = (until - datetime.now(TZ)).total_seconds()
+            if remaining <= 0:
+                return
+            self.stop_event.wait(min(0.2, remaining))
+            try: self.on_tick(datetime.now(TZ))
+            except Exception: pass
+
+    def _set_phase_at(self, dt: datetime) -> None:
+        self.phase_at = time.monotonic() + (dt - datetime.now(TZ)).total_seconds()
+
     def run(self):
         try:
-            now = datetime.now(TZ)
-            while not self.stop_event.is_set() and now < self.start_dt:
-                time.sleep(0.2)
-                now = datetime.now(TZ)
-                try: self.on_tick(now)
-                except Exception: pass
+            self._wait_until(self.start_dt)
 
             current = self.start_dt
             while not self.stop_event.is_set() and current < self.end_dt:
                 # FIRE
                 fire_until = min(current + self.fire_td, self.end_dt)
                 if datetime.now(TZ) < fire_until:
+                    self._set_phase_at(current)
                     try: self.on_fire()
                     except Exception: pass
-                while not self.stop_event.is_set() and datetime.now(TZ) < fire_until:
-                    time.sleep(0.2)
-                    try: self.on_tick(datetime.now(TZ))
-                    except Exception: pass
+                self._wait_until(fire_until)
                 if self.stop_event.is_set() or datetime.now(TZ) >= self.end_dt:
                     break
 
                 # REST
                 rest_until = min(fire_until + self.rest_td, self.end_dt)
                 if datetime.now(TZ) < rest_until:
+                    self._set_phase_at(fire_until)
                     try: self.on_rest(False)
                     except Exception: pass
-                while not self.stop_event.is_set() and datetime.now(TZ) < rest_until:
-                    time.sleep(0.2)
-                    try: self.on_tick(datetime.now(TZ))
-                    except Exception: pass
+                self._wait_until(rest_until)
                 current = rest_until
         finally:
+            self.phase_at = time.monotonic()
             try: self.on_rest(True)
             except Exception: pass
             try:
@@ -335,6 +244,20 @@ class CalendarDialog(tk.Toplevel):
 
 # ---------------- Tkinter App ----------------
 class App(tk.Tk):
+    LOG_BATCH_MAX = 2000  # ข้อความจาก msg_q ต่อรอบ _drain_logs (200 ms)
+
+    @property
+    def is_firing(self) -> bool:
+        """เลเซอร์หลักกำลังยิงอยู่ (มาจาก firing_devices เสมอ ไม่เก็บแยก)"""
+        return DEFAULT_DEVICE in self.firing_devices
+
+    @is_firing.setter
+    def is_firing(self, value: bool) -> None:
+        if value:
+            self.firing_devices.add(DEFAULT_DEVICE)
+        else:
+            self.firing_devices.discard(DEFAULT_DEVICE)
+
     def __init__(self):
         super().__init__()
         # --- Sliding roof API base ---192.168.3.209:8000/api/gpio/23
@@ -367,24 +290,54 @@ class App(tk.Tk):
         self._limit_poll_inflight = False
 
 
-        self.tele_pause_until = 0.0 
-
         self.msg_q: queue.Queue[str] = queue.Queue()
+        # เลเซอร์ทุกตัวอยู่ใน pool (key = device id); DEFAULT_DEVICE คือตัวที่ตั้งค่าจากแถบ Connection
+        # self.laser = client ของ DEFAULT_DEVICE (โค้ดเดิมทั้งหมดใช้ตัวนี้)
+        self.pool = LaserPool()
+        self._primary = self.pool.add(DeviceConfig(DEFAULT_DEVICE, "127.0.0.1", 2323))
         self.laser: LaserClient | None = None
-        self.is_firing = False
+        # คำสั่งแบบ fire-and-forget ทั้งหมด (_send) ออกตามลำดับผ่าน worker ของ DEFAULT_DEVICE
+        self.cmd_worker: CommandWorker = self._primary.worker
+        # device ที่กำลัง FIRE อยู่ (manual หรือ scheduler) — ที่เดียวที่เก็บสถานะยิง; is_firing = DEFAULT_DEVICE อยู่ในนี้
+        self.firing_devices: set[str] = set()
         self.manual_lock = threading.Lock()
 
         # Telemetry
         self.tele_thread: threading.Thread | None = None
-        self.tele_stop = threading.Event()
-        self.tele_interval_sec = 2
+        self.tele_stop = threading.Event()     # ของ worker CSV ตัวปัจจุบัน (สร้างใหม่ทุกครั้งที่เริ่ม)
+        self._tele_csv_sub = None               # subscription "csv" ของ worker ตัวปัจจุบัน
+        # ตัวอ่าน DTEMF/LTEMF/STATUS ตัวเดียวของ DEFAULT_DEVICE → กระจาย TelemetrySample ให้ผู้ใช้แต่ละราย
+        # (กราฟ/label/popup, over-temp guard, CSV) ผ่านคิวของใครของมัน: ตัวไหนช้าก็ทิ้งค่าเก่าของตัวเอง
+        # คาบการอ่านตามสถานะ (FIRE เร็ว / REST ช้า / idle ช้าสุด) + burst หลังเปลี่ยนสถานะ (settings: "tele_rates")
+        self.sampler = TelemetrySampler(self._read_telemetry, policy=SamplingPolicy(),
+                                        state=self._telemetry_state, tz=TZ)
+        self._ui_tele_sub = self.sampler.subscribe("ui", maxlen=64)
+        # over-temp guard อ่าน sample ล่าสุดของเลเซอร์ทุกตัว (ตัวอื่นเพิ่มตอนเริ่ม sampler ของมัน)
+        self._temp_subs = {DEFAULT_DEVICE: self.sampler.subscribe("overtemp", maxlen=1)}
+        self._link_state: dict[str, str] = {}   # device id → state ล่าสุดของลิงก์
+        # CSV telemetry: เปิดไฟล์ค้างไว้ + เขียนเป็นชุด (ตั้งได้ใน settings: csv_flush_rows / csv_flush_sec)
+        self.tele_sink = CsvSink(TELEMETRY_HEADER, flush_rows=30, flush_sec=10.0)
+        # timing ของ FIRE/STANDBY ตามรอบ: callback ของ send_at (บน I/O loop) แค่ enqueue, _timing_worker เขียนไฟล์
+        self._timing_q: queue.Queue = queue.Queue()
+        # คำสั่ง send_at ที่ตั้งเวลาไว้แต่ยังไม่ออก (ต่อเลเซอร์) → $STANDBY/$STOP ทันทีจะยกเลิกทิ้ง
+        self._timed_cmds: dict[str, set] = {}
+        self._timed_lock = threading.Lock()
+        threading.Thread(target=self._timing_worker, name="timing-csv", daemon=True).start()
         self.last_dtemf: float | None = None
         self.last_ltemf: float | None = None
+        self._status_ts = 0.0  # เวลา (monotonic) ที่ได้ STATUS จาก telemetry batch ล่าสุด
         self.tele_owner_idx: int | None = None  # ติดตามว่า CSV นี้เป็นของโปรแกรมไหน
+        self.stats_log_interval_sec = 600  # สรุป latency/timeout ของลิงก์เลเซอร์ทุก ๆ 10 นาที
+        # บันทึก byte ที่รับ/ส่งกับ controller ลง session_<stamp>.lsr (เปิดใน settings: "record_session")
+        self.record_session = False
+        # กราฟ live: "tk" = วาดบน Tk Canvas ตรง ๆ (เบา), "matplotlib" = แบบเดิม (settings: "chart_backend")
+        self.chart_backend = "tk"
+        self.chart_window = "1 h"   # ช่วงที่กราฟแสดง: ชื่อใน CHART_TIERS (settings: "chart_window")
+        self.log_max_lines = 5000    # เก็บบรรทัดใน Terminal / Scheduler log ไม่เกินนี้ (settings: "log_max_lines")
+        self.chart_seed_hours = 3.0  # ตอนเปิดโปรแกรม เติมกราฟจาก CSV ย้อนหลังกี่ชม. (settings: "chart_seed_hours")
 
         # CSV manual (parallel) สำหรับกรณีกด FIRE/STANDBY ระหว่าง Timer
         self.manual_parallel_path: str | None = None
-        self._manual_header_written: str | None = None
 
         # programs list (แต่ละโปรแกรมเก็บตัวแปร/วิดเจ็ต/สถานะของตัวเอง)
         self.programs: list[dict] = []
@@ -398,7 +351,7 @@ class App(tk.Tk):
         # --- Temp Control state (ต้องประกาศก่อน _build_ui) ---
         self.temp_ctl_enabled = tk.BooleanVar(value=True)
         self.max_temp_var     = tk.DoubleVar(value=32.5)
-        self._temp_alarm_active = True
+        self._temp_alarm: dict[str, bool] = {}   # device id → แจ้ง Over-Temp ไปแล้ว (ไม่มีในนี้ = True เหมือนเดิม)
 
         self._batch_stopping = True
         self.roof_auto_var = tk.BooleanVar(value=True)
@@ -423,10 +376,12 @@ class App(tk.Tk):
         self._init_plots()
         self.after(200, self._drain_logs)
         self.after(500, self._update_clock_and_plot)
+        self.sampler.start()
         self.after(1000, self._temp_monitor_tick)
-        self.after(1000, self._ui_telemetry_tick)
+        self.after(250, self._ui_telemetry_tick)
 
         self.after(1000, self._auto_update_status)
+        self.after(self.stats_log_interval_sec * 1000, self._log_link_stats)
 
         self.after(1000, self._monitor_roof_during_fire)
 
@@ -436,10 +391,12 @@ class App(tk.Tk):
 
         self.active_program_lock = threading.Lock()
         self.active_program_idx = None
+        self.active_by_device: dict[str, int] = {}  # device id → โปรแกรมที่ครองเลเซอร์ตัวนั้นอยู่
 
         self._load_config_into_ui()
         if not self.programs:  # อย่างน้อย 1 โปรแกรม
             self.add_program()
+        self._seed_charts_from_csv()
 
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -634,10 +591,12 @@ class App(tk.Tk):
         tab_all = ttk.Frame(nb); nb.add(tab_all, text="All except Schedule")
         ttk.Button(tab_all, text="Clear", command=self.clear_terminal).pack(anchor="ne", padx=6, pady=4)
         self.log_text = tk.Text(tab_all, height=16); self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.log_pane = LogPane(self.log_text, self.log_max_lines)
 
         tab_sched = ttk.Frame(nb); nb.add(tab_sched, text="Schedule Logs")
         ttk.Button(tab_sched, text="Clear", command=self.clear_sched_terminal).pack(anchor="ne", padx=6, pady=4)
         self.sched_log_text = tk.Text(tab_sched, height=16); self.sched_log_text.pack(fill=tk.BOTH, expand=True)
+        self.sched_log_pane = LogPane(self.sched_log_text, self.log_max_lines)
 
         self._build_config_tab(tab_cfg)
 
@@ -909,6 +868,10 @@ class App(tk.Tk):
         self._tutorial.start()
 
     def _auto_update_status(self):
+        # ถ้า telemetry เพิ่งได้ STATUS มาใน batch เดียวกันแล้ว ไม่ต้อง query ซ้ำ
+        if self.laser and time.monotonic() - self._status_ts < 5.0:
+            self.after(5000, self._auto_update_status)
+            return
         if self.laser:
             try:
                 status = self.laser.get_status()  # อาจได้ None ถ้า BUSY/timeout
@@ -924,6 +887,25 @@ class App(tk.Tk):
         # เว้น 5 วินาทีตามที่ต้องการ
         self.after(5000, self._auto_update_status)
 
+    def _log_link_stats(self):
+        # สรุปสถิติของ LaserClient (ทุกเลเซอร์ใน pool) ลง log panel และต่อท้าย link_stats.jsonl
+        for dev_id in self.pool.ids():
+            laser = self.pool.client(dev_id)
+            if not laser:
+                continue
+            try:
+                snap = laser.stats_snapshot()
+                self.log(f"[{dev_id}] " + LinkStats.format(snap))
+                snap["ts"] = datetime.now(TZ).isoformat(timespec="seconds")
+                snap["device"] = dev_id
+                if dev_id == DEFAULT_DEVICE:
+                    snap["telemetry_missed_slots"] = self.sampler.missed
+                with open(os.path.join(self.log_dir, "link_stats.jsonl"), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(snap) + "\n")
+            except Exception as e:
+                self.log(f"Link stats error ({dev_id}): {e}")
+        self.after(self.stats_log_interval_sec * 1000, self._log_link_stats)
+
     # ----- Program Tab Builder -----
     def add_program(self, init_data: dict | None = None):
         idx = len(self.programs)
@@ -948,6 +930,7 @@ class App(tk.Tk):
             "edit_mode": tk.BooleanVar(value=True),
 
             "paused": threading.Event(),   # True = paused
+            "device": tk.StringVar(value=DEFAULT_DEVICE),  # เลเซอร์ที่โปรแกรมนี้สั่ง
 
         }
 
@@ -966,6 +949,7 @@ class App(tk.Tk):
             vars["end"].set(init_data.get("end", "16:50"))
             vars["fire_ms"].set(self._ms_to_minutes_text(int(init_data.get("fire_ms", 60000))))
             vars["rest_ms"].set(self._ms_to_minutes_text(int(init_data.get("rest_ms", 60000))))
+            vars["device"].set(init_data.get("device", DEFAULT_DEVICE))
 
 
             vars["edit_mode"] = tk.BooleanVar(value=True)  # เริ่มต้นแก้ไขได้
@@ -1014,6 +998,14 @@ class App(tk.Tk):
         ttk.Button(row0, text="Apply", command=_apply_name).pack(side=tk.LEFT, padx=4)
         name_entry.bind("<Return>", _apply_name)
 
+        ttk.Label(row0, text="Laser").pack(side=tk.LEFT, padx=4)
+        dev_cb = ttk.Combobox(row0, textvariable=vars["device"], width=10, state="readonly",
+                              values=self.pool.ids())
+        dev_cb.configure(postcommand=lambda cb=dev_cb: cb.configure(values=self.pool.ids()))
+        dev_cb.pack(side=tk.LEFT, padx=4)
+        dev_cb.bind("<<ComboboxSelected>>", lambda _e: self.save_config())
+        vars["device_cb"] = dev_cb
+
         # Row 1: time + fire/rest
         row1 = ttk.Frame(tab); row1.pack(fill=tk.X, pady=3)
         ttk.Label(row1, text="Start (HH:MM)").pack(side=tk.LEFT)
@@ -1131,9 +1123,7 @@ class App(tk.Tk):
         except Exception:
             pass
 
-        with self.active_program_lock:
-            if self.active_program_idx == idx:
-                self.active_program_idx = None
+        self._release_active(idx)
 
         # หยุดการทำงานก่อนลบแท็บ/ลบ list
         self.stop_program(idx)
@@ -1171,6 +1161,7 @@ class App(tk.Tk):
             "end": v["end"].get(),
             "fire_ms": self._minutes_text_to_ms(v["fire_ms"].get()),
             "rest_ms": self._minutes_text_to_ms(v["rest_ms"].get()),
+            "device": self._device_of(v),
         }
 
         if init_data["mode"] == "once":
@@ -1203,21 +1194,21 @@ class App(tk.Tk):
                 pass
 
         # บังคับ STANDBY
-        self.tele_pause_until = time.monotonic() + 1.5
-
         try:
-            self._send("$STANDBY")
+            self._send_to(self._device_of(v), "$STANDBY")
             self._sched_log(idx, "Force → $STANDBY (Pause)")
         except Exception as e:
             self._sched_log(idx, f"Force STANDBY failed (Pause): {e}")
 
+        dev_id = self._device_of(v)
         with self.manual_lock:
-            self.is_firing = False
+            self.firing_devices.discard(dev_id)
 
-        try:
-            self.after(0, lambda: self._append_status_point(0))
-        except Exception:
-            pass
+        if dev_id == DEFAULT_DEVICE:
+            try:
+                self.after(0, lambda: self._append_status_point(0))
+            except Exception:
+                pass
 
 
         # หยุด CSV ถ้ากำลังบันทึกอยู่ (ตามพฤติกรรมเดียวกับ stop_program)
@@ -1284,56 +1275,102 @@ class App(tk.Tk):
 
     # ---------- Plots ----------
     def _init_plots(self):
-        self.fig = Figure(figsize=(8, 5.2), dpi=100)
-        self.ax1 = self.fig.add_subplot(211)
-        self.ax1.set_ylim(-0.2, 1.2); self.ax1.set_ylabel("FIRE (1) / REST (0)")
-        self.ax1.grid(True, linestyle=":", alpha=0.5)
-        self.line_x, self.line_y = [], []
-        (self.line_status,) = self.ax1.plot([], [], lw=2)
-
-        self.ax2 = self.fig.add_subplot(212)
-        self.ax2.set_ylabel("DTEMF / LTEMF")
-        self.ax2.grid(True, linestyle=":", alpha=0.5)
-        self.tele_x, self.tele_d, self.tele_l = [], [], []
-        (self.line_dtemf,) = self.ax2.plot([], [], lw=1.6, label="DTEMF")
-        (self.line_ltemf,) = self.ax2.plot([], [], lw=1.6, label="LTEMF")
-        self.ax2.legend(loc="upper left")
-        
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
-        self.canvas.draw()
-        widget = self.canvas.get_tk_widget()
+        # สถานะ FIRE/REST เก็บเฉพาะจุดเปลี่ยน (เวลาจริงของขอบ) ย้อนหลัง CHART_WINDOW_SEC
+        self.status_series = StepSeries(CHART_WINDOW_SEC)
+        # telemetry (คอลัมน์ 0 = DTEMF, 1 = LTEMF) เก็บพร้อมกันทุกความละเอียดใน CHART_TIERS:
+        # raw 5 นาที (พอสำหรับอัตราสูงสุดของ sampler), min/max ต่อ 10 วินาที และต่อ 1 นาที
+        self.tele_tiers = TieredSeries(2, self.sampler.policy.min_sec)
+        # ระหว่างโหลดค่าย้อนหลังจาก CSV จุดใหม่จะพักไว้ที่นี่ (series ต้องเติมตามลำดับเวลา)
+        self._chart_pending: list | None = None
+
+        bar = ttk.Frame(self.plot_frame)
+        bar.pack(side=tk.TOP, fill=tk.X, padx=4, pady=(2, 0))
+        ttk.Label(bar, text="Window:").pack(side=tk.LEFT)
+        self.chart_window_var = tk.StringVar(value=self.chart_window)
+        cb = ttk.Combobox(bar, textvariable=self.chart_window_var, width=8, state="readonly",
+                          values=[name for name, _, _ in CHART_TIERS])
+        cb.pack(side=tk.LEFT, padx=4)
+        cb.bind("<<ComboboxSelected>>", lambda e: self._set_chart_window(self.chart_window_var.get()))
+
+        self.live_plot = None
+        self._build_live_plot()
+
+    def _chart_view(self):
+        """(status, telemetry) ของช่วงที่เลือกอยู่ สำหรับส่งให้ live plot / export"""
+        window = self.tele_tiers.windows[self.chart_window]
+        status = self.status_series if window >= CHART_WINDOW_SEC else self.status_series.clipped(window)
+        return status, self.tele_tiers.tiers[self.chart_window]
+
+    def _set_chart_window(self, name: str, save: bool = True):
+        """สลับช่วงเวลาของกราฟทันที (ข้อมูลทุก tier มีอยู่แล้ว ไม่ต้องคำนวณย้อนหลัง); save=False ตอนโหลด settings"""
+        if name not in self.tele_tiers.tiers:
+            return
+        changed = name != self.chart_window
+        self.chart_window = name
+        if hasattr(self, "chart_window_var"):
+            self.chart_window_var.set(name)
+        if getattr(self, "live_plot", None) is not None:
+            self.live_plot.render(*self._chart_view())
+        if changed and save:
+            self.save_config()
+
+    def _build_live_plot(self):
+        """สร้าง (หรือสลับ) backend ของกราฟ live ตาม self.chart_backend"""
+        if self.live_plot is not None:
+            self.live_plot.destroy()
+        try:
+            self.live_plot = make_live_plot(self.chart_backend, self.plot_frame, TZ)
+        except Exception as e:
+            self.log(f"Chart backend '{self.chart_backend}' ใช้ไม่ได้ ({e}) → ใช้ Tk")
+            self.chart_backend = "tk"
+            self.live_plot = make_live_plot("tk", self.plot_frame, TZ)
+        widget = self.live_plot.widget
         widget.pack(fill=tk.BOTH, expand=True)
 
         # ▼ สร้างเมนูคลิกขวาสำหรับกราฟ
         self.chart_menu = tk.Menu(widget, tearoff=0)
         self.chart_menu.add_command(label="Clear chart", command=self.clear_charts)
+        self.chart_menu.add_command(label="Save chart image…", command=self.save_chart_image)
+        self.chart_menu.add_separator()
+        for kind in LIVE_PLOTS:
+            if kind != self.chart_backend:
+                self.chart_menu.add_command(label=f"Switch to {kind} chart",
+                                            command=lambda k=kind: self._set_chart_backend(k))
 
         # bind คลิกขวา (ปุ่ม 3) ให้แสดงเมนู
         widget.bind("<Button-3>", self._on_chart_right_click)
 
-    def clear_charts(self):
-        """ล้างข้อมูลกราฟทั้งหมด"""
-        # ล้างข้อมูลที่เก็บไว้
-        self.line_x.clear()
-        self.line_y.clear()
-        self.tele_x.clear()
-        self.tele_d.clear()
-        self.tele_l.clear()
-
-        # ล้างเส้นกราฟ
-        self.line_status.set_data([], [])
-        self.line_dtemf.set_data([], [])
-        self.line_ltemf.set_data([], [])
-
-        # รีเซ็ตแกนให้เป็นค่า default คร่าว ๆ
-        now = datetime.now(TZ)
-        self.ax1.set_xlim(now - timedelta(minutes=5), now + timedelta(seconds=5))
-        self.ax1.set_ylim(-0.2, 1.2)
+    def _set_chart_backend(self, kind: str, save: bool = True):
+        """สลับ backend ของกราฟ; save=False ตอนโหลดค่าจาก settings (ไม่ต้องเขียนไฟล์กลับ)"""
+        if kind == self.chart_backend or kind not in LIVE_PLOTS:
+            return
+        self.chart_backend = kind
+        self._build_live_plot()
+        self.live_plot.render(*self._chart_view())
+        self.log(f"Chart backend → {self.chart_backend}")
+        if save:
+            self.save_config()
 
-        self.ax2.set_xlim(now - timedelta(minutes=5), now + timedelta(seconds=5))
-        self.ax2.set_ylim(0, 1)  # เดี๋ยวพอมีข้อมูลใหม่ autoscale ใน `_update_clock_and_plot`
+    def save_chart_image(self):
+        """บันทึกกราฟช่วงปัจจุบันเป็น PNG (วาดด้วย matplotlib ไม่ว่ากราฟบนจอจะเป็น backend ไหน)"""
+        stamp = datetime.now(TZ).strftime('%Y%m%d_%H%M%S')
+        path = filedialog.asksaveasfilename(
+            title="Save chart image", defaultextension=".png",
+            initialdir=getattr(self, "log_dir", LOG_DIR), initialfile=f"chart_{stamp}.png",
+            filetypes=[("PNG image", "*.png")])
+        if not path:
+            return
+        try:
+            export_png(path, *self._chart_view(), TZ)
+            self.log(f"Chart saved → {path}")
+        except Exception as e:
+            messagebox.showerror("Chart", f"Cannot save chart: {e}")
 
-        self.canvas.draw_idle()
+    def clear_charts(self):
+        """ล้างข้อมูลกราฟทั้งหมด"""
+        self.status_series.clear()
+        self.tele_tiers.clear()
+        self.live_plot.reset()
         self.log("Clear charts")
 
     def _on_chart_right_click(self, event):
@@ -1344,46 +1381,81 @@ class App(tk.Tk):
             self.chart_menu.grab_release()
 
     def _append_status_point(self, y: int):
-        now = datetime.now(TZ)
-        self.line_x.append(now); self.line_y.append(y)
-        cutoff = now - timedelta(hours=3)
-        while self.line_x and self.line_x[0] < cutoff:
-            self.line_x.pop(0); self.line_y.pop(0)
+        # บันทึกเฉพาะเมื่อค่าเปลี่ยน; ไม่เปลี่ยนก็แค่ยืดเส้นถึงเวลาปัจจุบัน
+        if self._chart_pending is not None:
+            self._chart_pending.append((self.status_series.set, (time.time(), y)))
+            return
+        self.status_series.set(time.time(), y)
 
-    def _append_telemetry_point(self, d: float | None, l: float | None):
-        now = datetime.now(TZ)
-        self.tele_x.append(now)
-        self.tele_d.append(float("nan") if d is None else d)
-        self.tele_l.append(float("nan") if l is None else l)
-        cutoff = now - timedelta(hours=3)
-        while self.tele_x and self.tele_x[0] < cutoff:
-            self.tele_x.pop(0); self.tele_d.pop(0); self.tele_l.pop(0)
+    def _append_telemetry_point(self, d: float | None, l: float | None, now: datetime | None = None):
+        t = now.timestamp() if now else time.time()
+        if self._chart_pending is not None:
+            self._chart_pending.append((self.tele_tiers.add, (t, d, l)))
+            return
+        self.tele_tiers.add(t, d, l)
+
+    def _seed_charts_from_csv(self):
+        """เติมกราฟด้วยค่า chart_seed_hours ชม. ล่าสุดจาก telemetry CSV (อ่านจากท้ายไฟล์, ใน thread แยก)"""
+        hours = float(self.chart_seed_hours)
+        if hours <= 0:
+            return
+        log_dir = getattr(self, "log_dir", LOG_DIR)
+        until = time.time()  # แถวหลังจากนี้จะมาทาง sampler อยู่แล้ว
+        since = until - hours * 3600
+        self._chart_pending = []
+
+        def worker():
+            rows = []
+            try:
+                for name in os.listdir(log_dir):
+                    path = os.path.join(log_dir, name)
+                    if CHART_SEED_RE.match(name) and os.path.getmtime(path) >= since:
+                        rows.extend(tail_rows(path, since, TZ))
+            except Exception as e:
+                self.log(f"Chart: อ่าน CSV ย้อนหลังล้มเหลว: {e}")
+            rows = sorted((r for r in rows if r[0] < until), key=lambda r: r[0])
+            self._ui_call(self._apply_chart_seed, rows)
+
+        threading.Thread(target=worker, name="chart-seed", daemon=True).start()
+
+    def _apply_chart_seed(self, rows):
+        pending, self._chart_pending = self._chart_pending or [], None
+        last_t = None
+        n = 0
+        for t, st, d, l in rows:
+            if last_t is not None and t - last_t < 0.05:
+                continue  # แถวซ้ำ (ไฟล์ Manual parallel เขียนแถวเดียวกับไฟล์หลัก)
+            last_t = t
+            if st is not None:
+                self.status_series.set(t, st)
+            if d is not None or l is not None:
+                self.tele_tiers.add(t, d, l)
+            n += 1
+        for fn, args in pending:
+            fn(*args)
+        if n:
+            self.log(f"Chart: โหลดค่าย้อนหลัง {n} แถวจาก CSV ({self.chart_seed_hours:g} ชม.)")
 
     def _ui_telemetry_tick(self):
         """
-        อัปเดตตัวเลขบน UI และกราฟ 'ตลอดเวลา'
-        - ถ้ากำลังอัด CSV อยู่: ปล่อยให้ thread CSV เป็นคนอ่าน ลดการชนกัน (แต่ยังอัปเดต label จากค่า last_* ที่มี)
-        - ถ้าไม่ได้อัด CSV: อ่านแบบเบา ๆ ด้วย try_send_cmd(timeout สั้น) โดยไม่แย่งงานคำสั่งควบคุม
+        อัปเดตตัวเลขบน UI, กราฟ, สถานะ และ popup overheat จาก sample ที่ sampler ส่งมา
+        (ไม่ query เลเซอร์เอง; ถ้า UI ค้างนาน คิวเก็บไว้ 64 sample ล่าสุด)
         """
         try:
-            # ถ้า CSV thread ทำงานอยู่ ให้หลีกทาง (ไม่ query ซ้ำ)
-            csv_running = bool(self.tele_thread and self.tele_thread.is_alive())
-
-            if not csv_running:
-                # อ่านแบบเบา ๆ (quiet + non-blocking)
-                d = self._query_float_quiet("$DTEMF ?", timeout_s=0.35)
-                l = self._query_float_quiet("$LTEMF ?", timeout_s=0.35)
-
-                # อัปเดตค่า cache/label ถ้าอ่านได้
-                if d is not None:
-                    self.last_dtemf = d
-                if l is not None:
-                    self.last_ltemf = l
-
-                # อัปเดตกราฟเมื่อมีค่าใหม่อย่างน้อยหนึ่งตัว
-                if d is not None or l is not None:
-                    self._append_telemetry_point(d if d is not None else self.last_dtemf,
-                                                l if l is not None else self.last_ltemf)
+            samples = self._ui_tele_sub.drain()
+            for s in samples:
+                if s.dtemf is not None:
+                    self.last_dtemf = s.dtemf
+                if s.ltemf is not None:
+                    self.last_ltemf = s.ltemf
+                if s.dtemf is not None or s.ltemf is not None:
+                    self._append_telemetry_point(self.last_dtemf, self.last_ltemf, s.wall)
+            if samples:
+                st = samples[-1].status
+                if st:
+                    self._status_ts = samples[-1].mono
+                    self.laser_status_var.set(f"Laser: {st.label}")
+                self._update_overheat_popup(samples[-1].ltemf)
 
             # อัปเดต Label จากค่า cache ล่าสุด (ถ้ามี)
             if self.last_dtemf is not None:
@@ -1392,24 +1464,156 @@ class App(tk.Tk):
                 self.lbl_ltemf.config(text=f"{self.last_ltemf}")
 
         finally:
-            # วนทุก 1 วินาที
-            self.after(1000, self._ui_telemetry_tick)
+            self.after(250, self._ui_telemetry_tick)
+
+    def _update_overheat_popup(self, ltemf: float | None):
+        try:
+            maxv = float(self.max_temp_var.get())
+            temp_enabled = bool(self.temp_ctl_enabled.get())
+        except Exception:
+            return
+        if ltemf is None:
+            return
+        if temp_enabled and ltemf > maxv:
+            self._show_overheat_popup(float(ltemf), maxv)
+        else:
+            self._hide_overheat_popup()
 
     # ---------- Connection & Commands ----------
     def connect(self):
         host, port = self.ip_var.get().strip(), self.port_var.get()
+        user = self.user_var.get().strip()
+        self.laser = None
         try:
-            self.laser = LaserClient(host, port); self.laser.connect()
+            # LOGIN ทำโดย LaserClient ทุกครั้งที่ (re)connect
+            self._primary.cfg.host, self._primary.cfg.port, self._primary.cfg.user = host, int(port), user
+
+            self._primary.connect(lambda c: self._setup_client(DEFAULT_DEVICE, c))
+            self.laser = self._primary.client
             self.log(f"Connected to {host}:{port}")
             self.conn_status.config(text="Connected", foreground="green")
-            self._send(f"$LOGIN {self.user_var.get().strip()}")
-            self.log(f"LOGIN user → {self.user_var.get().strip()}")
+            if user:
+                self.msg_q.put(f">> $LOGIN {user}\n<< {self.laser.login_reply}")
+            self.log(f"LOGIN user → {user}")
             self.save_config()
+            self._connect_other_lasers()
         except Exception as e:
+            self.laser = None
             messagebox.showerror("Connect failed", str(e))
             self.log(f"Connect failed: {e}")
             self.conn_status.config(text="Disconnected", foreground="red")
 
+    def _connect_other_lasers(self):
+        """เชื่อมต่อเลเซอร์ตัวอื่นใน pool แบบขนาน (background) แล้วเริ่ม sampler ของแต่ละตัว"""
+        others = [i for i in self.pool.ids() if i != DEFAULT_DEVICE]
+        if not others:
+            return
+
+        def worker():
+            res = self.pool.connect_all(ids=others, setup=self._setup_client)
+            ok = [i for i, e in res.items() if e is None]
+            for dev_id, e in res.items():
+                self.log(f"Laser {dev_id}: " + ("connected" if e is None else f"connect failed: {e}"))
+            self._start_device_telemetry(ok)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _start_device_telemetry(self, ids):
+        """TelemetrySampler ต่อเลเซอร์ (คาบตาม policy เดียวกับตัวหลัก + burst) → CSV ของแต่ละตัว"""
+        samplers = self.pool.start_sampling(ids, policy=self.sampler.policy, state=self._device_state, tz=TZ)
+        for dev_id, sampler in samplers.items():
+            self._temp_subs[dev_id] = sampler.subscribe("overtemp", maxlen=1)
+            sub = sampler.subscribe("csv", maxlen=256)
+            threading.Thread(target=self._device_telemetry_worker, args=(dev_id, sub),
+                             name=f"telemetry-csv {dev_id}", daemon=True).start()
+
+    def _device_telemetry_worker(self, dev_id: str, sub):
+        """telemetry_<device>_<date>.csv ผ่าน CsvSink (คอลัมน์เดียวกับไฟล์หลัก รวม EPOCH/MONO/MISSED)"""
+        # จบเองเมื่อ pool.stop_sampling() หยุด sampler (subscription ถูกปิด → get() คืน None)
+        sink = CsvSink(TELEMETRY_HEADER, flush_rows=self.tele_sink.flush_rows, flush_sec=self.tele_sink.flush_sec)
+        try:
+            while True:
+                s = sub.get(timeout=0.5)
+                if s is None:
+                    if sub.closed:
+                        break
+                    sink.flush_if_due()
+                    continue
+                with self.manual_lock:
+                    status_num = 1 if dev_id in self.firing_devices else 0
+                try:
+                    maxv = float(self.max_temp_var.get())
+                except Exception:
+                    maxv = None
+                path = os.path.join(self.log_dir, f"telemetry_{dev_id}_{s.wall.strftime('%Y%m%d')}.csv")
+                try:
+                    # ขึ้นวันใหม่ → path เปลี่ยน, sink ปิดไฟล์ของวันก่อนให้เอง
+                    sink.write([path], self._telemetry_row(s, status_num, "", s.dtemf, s.ltemf, maxv))
+                except Exception as e:
+                    self.log(f"Laser {dev_id}: telemetry CSV error: {e}")
+        finally:
+            try:
+                sink.close()
+            except Exception as e:
+                self.log(f"Laser {dev_id}: telemetry CSV close error: {e}")
+
+    def _device_state(self, dev_id: str) -> str:
+        """สถานะของเลเซอร์ตัวอื่นสำหรับ SamplingPolicy (เรียกจาก thread ของ sampler ตัวนั้น)"""
+        if dev_id in self.firing_devices:
+            return STATE_FIRE
+        if dev_id in self.active_by_device:
+            return STATE_REST
+        return STATE_IDLE
+
+    def _setup_client(self, dev_id: str, c: LaserClient):
+        """ก่อน connect ของเลเซอร์ทุกตัว: listener ลิงก์, สถานะจาก $STATUS, บันทึก session"""
+        c.add_state_listener(lambda state, detail: self._on_link_state(dev_id, state, detail))
+        c.status.subscribe(lambda ev: self._on_status_event(dev_id, ev))
+        if self.record_session:
+            stamp = datetime.now(TZ).strftime("%Y%m%d_%H%M%S")
+            name = f"session_{stamp}.lsr" if dev_id == DEFAULT_DEVICE else f"session_{dev_id}_{stamp}.lsr"
+            c.recorder = SessionRecorder(os.path.join(self.log_dir, name))
+            self.log(f"Recording laser session → {c.recorder.path}")
+
+    def _on_link_state(self, dev_id: str, state: str, detail: str):
+        """callback จาก LaserClient ของเลเซอร์ dev_id (I/O thread): ลิงก์หลุด/กลับมา"""
+        primary = dev_id == DEFAULT_DEVICE
+        name = "Laser" if primary else f"Laser {dev_id}"
+        prev = self._link_state.get(dev_id)
+        self._link_state[dev_id] = state
+        if state == STATE_RECONNECTING:
+            self.log(f"{name} link DOWN → reconnecting: {detail}")
+            if primary:
+                self._ui_call(self.conn_status.config, text="Reconnecting…", foreground="orange")
+        elif state == STATE_CONNECTED and prev == STATE_RECONNECTING:
+            laser = self.pool.client(dev_id)
+            self.log(f"{name} link UP ({detail}), LOGIN → {laser.login_reply if laser else ''}")
+            if primary:
+                self._ui_call(self.conn_status.config, text="Connected", foreground="green")
+            # ถ้ากำลังอยู่ในช่วง FIRE ตอนลิงก์หลุด → ยิงต่อ (ผ่าน roof guard เหมือนเดิม)
+            with self.manual_lock:
+                firing = dev_id in self.firing_devices
+            if firing:
+                self.log(f"{name}: link restored during FIRE → re-send $FIRE")
+                self._safe_fire(device=dev_id)
+
+    def _on_status_event(self, dev_id: str, ev):
+        """callback จาก LaserClient.status (I/O thread): สถานะเลเซอร์เปลี่ยนจาก $STATUS"""
+        primary = dev_id == DEFAULT_DEVICE
+        prefix = "" if primary else f"Laser {dev_id} "
+        if ev.kind == EV_MODE:
+            if primary:
+                self._ui_call(self.laser_status_var.set, f"Laser: {ev.status.label}")
+            if ev.old is not None:
+                self.log(f"{prefix}STATUS: {ev.old} → {ev.new}")
+        elif ev.kind == EV_READY:
+            if primary:
+                self._ui_call(self.laser_status_var.set, f"Laser: {ev.status.label}")
+            self.log(f"{prefix}STATUS: {'Ready' if ev.new else 'Not Ready'}")
+        else:
+            self.log(f"{prefix}STATUS flag {ev.new or ev.old} {'set' if ev.kind.endswith('SET') else 'cleared'}"
+                     f" (word {ev.status.word:08X})")
+
     def disconnect(self):
         # Stop all running programs before disconnecting
         try:
@@ -1423,21 +1627,95 @@ class App(tk.Tk):
             except Exception: pass
 
         self._stop_telemetry()
-        if self.laser: self.laser.close()
-        self.log("Disconnected")
+        self.pool.stop_sampling()
+        links = [(d, d.client) for d in map(self.pool.device, self.pool.ids()) if d and d.client]
+        self.laser = None
         self.conn_status.config(text="Disconnected", foreground="red")
 
-    def _send(self, cmd: str):
-        def worker():
-            try:
-                if not self.laser: raise RuntimeError("Not connected")
-                resp = self.laser.send_cmd(cmd)
-                self.msg_q.put(f">> {cmd}\n<< {resp}")
-                return resp
-            except Exception as e:
-                self.msg_q.put(f">> {cmd}\n!! {e}")
-                return ""
-        threading.Thread(target=worker, daemon=True).start()
+        def close_all():
+            # flush รอได้ถึง 2 วิ/เครื่อง → ทำนอก Tk thread ไม่ให้ UI ค้าง
+            for dev, c in links:
+                dev.worker.flush(timeout=2.0)  # ให้ $STANDBY จาก stop_all_programs ออกไปก่อน
+                if dev.client is c:            # ถ้า connect ใหม่ระหว่างนี้ ไม่ปิดลิงก์ใหม่
+                    dev.close_client()
+            self.log("Disconnected")
+
+        threading.Thread(target=close_all, name="laser-disconnect", daemon=True).start()
+
+    def _send(self, cmd: str, on_done=None):
+        """
+        ส่งคำสั่งผ่าน cmd_worker (เรียงตามลำดับ, $STANDBY/$STOP ที่ซ้ำติดกันถูกรวมเป็นครั้งเดียว)
+        on_done(cmd, resp, err) ถูกเรียกบน worker thread หลังได้คำตอบ
+        """
+        self._cancel_timed_if_stop(DEFAULT_DEVICE, cmd)
+        def done(c, resp, err):
+            if err is not None:
+                self.msg_q.put(f">> {c}\n!! {err}")
+            else:
+                self.msg_q.put(f">> {c}\n<< {resp}")
+            if on_done:
+                on_done(c, resp, err)
+        self.cmd_worker.submit(cmd, done)
+
+    def _send_to(self, device: str, cmd: str, on_done=None):
+        """เหมือน _send แต่เลือกเลเซอร์ใน pool (DEFAULT_DEVICE → _send)"""
+        if device == DEFAULT_DEVICE:
+            self._send(cmd, on_done)
+            return
+        dev = self.pool.device(device)
+        if dev is None:
+            self.msg_q.put(f"[{device}] >> {cmd}\n!! unknown device")
+            return
+        self._cancel_timed_if_stop(device, cmd)
+
+        def done(c, resp, err):
+            self.msg_q.put(f"[{device}] >> {c}\n" + (f"!! {err}" if err is not None else f"<< {resp}"))
+            if on_done:
+                on_done(c, resp, err)
+        dev.send(cmd, done)
+
+    def _send_at(self, device: str, cmd: str, at: float):
+        """
+        ส่ง cmd ตรงเวลา at (time.monotonic) ผ่าน LaserClient.send_at → Future[CommandTiming]
+        (None ถ้าเลเซอร์ไม่ได้เชื่อมต่อ)
+        send_at ไม่ผ่าน cmd_worker จึงจดไว้ใน _timed_cmds: ถ้ามี $STANDBY/$STOP ทันทีเข้ามาก่อนถึงเวลา
+        คำสั่งที่ตั้งเวลาไว้จะถูกยกเลิก → FIRE ตามรอบไม่มีทางออกไปหลัง stop/pause
+        """
+        laser = self.pool.client(device)
+        if not (laser and laser.connected):
+            return None
+        fut = laser.send_at(cmd, at)
+        with self._timed_lock:
+            self._timed_cmds.setdefault(device, set()).add(fut)
+
+        def _forget(f):
+            with self._timed_lock:
+                self._timed_cmds.get(device, set()).discard(f)
+        fut.add_done_callback(_forget)
+        return fut
+
+    def _cancel_timed_if_stop(self, device: str, cmd: str):
+        """$STANDBY/$STOP ทันทีชนะคำสั่ง send_at ของเลเซอร์ตัวเดียวกันที่ยังไม่ถึงเวลา"""
+        if reply_head(cmd) not in CommandWorker.COLLAPSE_CMDS:
+            return
+        with self._timed_lock:
+            pending = list(self._timed_cmds.get(device, ()))
+        for f in pending:
+            f.cancel()  # ออกไปแล้วก็ยกเลิกไม่ได้ → ไม่เป็นไร คำสั่งนี้ตามหลังอยู่แล้ว
+
+    def _device_of(self, v: dict) -> str:
+        try:
+            return v["device"].get().strip() or DEFAULT_DEVICE
+        except Exception:
+            return DEFAULT_DEVICE
+
+    def _release_active(self, idx: int):
+        with self.active_program_lock:
+            if self.active_program_idx == idx:
+                self.active_program_idx = None
+            for dev_id, owner in list(self.active_by_device.items()):
+                if owner == idx:
+                    del self.active_by_device[dev_id]
 
     # ---------- Manual controls ----------
     def cmd_fire(self):
@@ -1489,12 +1767,10 @@ class App(tk.Tk):
                 stamp = datetime.now(TZ).strftime('%Y%m%d_%H%M%S')
                 manual_csv = os.path.join(getattr(self, "log_dir", LOG_DIR), f"telemetry_manual_{stamp}.csv")
                 self.manual_parallel_path = manual_csv
-                self._manual_header_written = None
                 self.log(f"CSV MANUAL PARALLEL START → {manual_csv}")
             # ถ้า tele_owner_idx เป็น None แสดงว่า thread นี้เป็นของ Manual อยู่แล้ว → ไม่ต้องทำอะไรเพิ่ม
 
     def cmd_standby(self):
-        self.tele_pause_until = time.monotonic() + 1.5
         with self.manual_lock:
             self.is_firing = False
         self._append_status_point(0)
@@ -1506,7 +1782,6 @@ class App(tk.Tk):
             if self.manual_parallel_path:
                 self.log(f"CSV MANUAL PARALLEL STOP → {self.manual_parallel_path}")
             self.manual_parallel_path = None
-            self._manual_header_written = None
         else:
             # โหมด Manual ปกติ: STANDBY แล้วหยุด CSV ทั้งหมด
             if self.tele_thread and self.tele_thread.is_alive():
@@ -1596,41 +1871,34 @@ class App(tk.Tk):
         try:
             if new_file:
                 with open(path, "w", newline="", encoding="utf-8") as f:
-                    csv.writer(f).writerow([
-                        "Date", "Time", "Timezone",
-                        "STATUS", "QSDELAY", "DTEMF", "LTEMF", "overload", "ROOF_STATUS"
-                    ])
+                    csv.writer(f).writerow(TELEMETRY_HEADER)
         except Exception as e:
             messagebox.showerror("CSV", f"Cannot create CSV file: {e}")
             self.record_var.set(False); return
 
-        if self.tele_thread and self.tele_thread.is_alive():
-            self.tele_stop.set()
-            try:
-                self.tele_thread.join(timeout=0.5)
-            except Exception:
-                pass
-            self.tele_stop.clear()
+        self._signal_telemetry_stop()
+
+        # CSV เป็นผู้รับ sample อีกรายหนึ่ง: คิวยาวกว่า UI เพื่อไม่ให้แถวหายตอนดิสก์ช้า
+        # worker แต่ละตัวมี stop event + subscription ของตัวเอง → ตัวเก่าที่ยังไม่จบไม่พลาดคำสั่งหยุด
+        stop = self.tele_stop = threading.Event()
+        sub = self._tele_csv_sub = self.sampler.subscribe("csv", maxlen=256)
 
         def worker():
             self.log("เริ่มเก็บ Telemetry (CSV)")
+            last_d = last_l = None
 
-            while not self.tele_stop.is_set():
-                if time.monotonic() < self.tele_pause_until:
-                    time.sleep(0.2)
+            while not stop.is_set():
+                s = sub.get(timeout=0.5)
+                if s is None:
+                    if sub.closed:
+                        break
+                    # ไม่มี sample (idle ช้า / BUSY / ลิงก์หลุด) → แถวที่ค้างยังต้องลงไฟล์ตาม flush_sec
+                    try:
+                        self.tele_sink.flush_if_due()
+                    except Exception as e:
+                        self.log(f"บันทึก CSV ล้มเหลว: {e}")
                     continue
-
-                ts = datetime.now(TZ).isoformat(timespec="seconds")
-                d = self._query_float("$DTEMF ?")
-                l = self._query_float("$LTEMF ?")
-
-                if d is not None:
-                    self.last_dtemf = d
-                    self.after(0, lambda v=d: self.lbl_dtemf.config(text=f"{v}"))
-                if l is not None:
-                    self.last_ltemf = l
-                    self.after(0, lambda v=l: self.lbl_ltemf.config(text=f"{v}"))
-
+                d, l = s.dtemf, s.ltemf
 
                 with self.manual_lock:
                     status_num = 1 if self.is_firing else 0
@@ -1642,141 +1910,106 @@ class App(tk.Tk):
                     maxv = None
 
                 # ===== จำค่าล่าสุดของ DTEMF / LTEMF =====
-                if not hasattr(self, "last_dtemf_value"):
-                    self.last_dtemf_value = None
-                if not hasattr(self, "last_ltemf_value"):
-                    self.last_ltemf_value = None
-
                 if d is not None:
-                    self.last_dtemf_value = d
+                    last_d = d
                 else:
-                    d = self.last_dtemf_value
+                    d = last_d
 
                 if l is not None:
-                    self.last_ltemf_value = l
+                    last_l = l
                 else:
-                    l = self.last_ltemf_value
-
-                # overload according to LTEMF > max (only when Temp Control is enabled)
-                try:
-                    temp_enabled = bool(self.temp_ctl_enabled.get())
-                except Exception:
-                    temp_enabled = True
-                overload = (temp_enabled and l is not None and maxv is not None and l > maxv)
-
-                try:
-                    self.after(0, lambda dd=d, ll=l: self._append_telemetry_point(
-                        float(dd) if dd is not None else None,
-                        float(ll) if ll is not None else None
-                    ))
-                except Exception:
-                    pass
-
-                if overload:
-                    self._ui_call(self._show_overheat_popup, float(l), float(maxv))
-                else:
-                    self._ui_call(self._hide_overheat_popup)
+                    l = last_l
 
                 try:
                     # เตรียม row เดียว ใช้ได้ทั้ง main CSV และ manual parallel
-                    now = datetime.now(TZ)
-                    date_str = now.strftime("%Y-%m-%d")
-                    time_str = now.strftime("%H:%M:%S")
-                    tz_str = now.tzname() or "UTC+7"
-
-                    roof_state = self._get_roof_status_cached()
-
-                    row = [
-                        date_str,           # Date
-                        time_str,           # Time
-                        tz_str,             # Timezone
-                        status_num,         # STATUS (1 = Fire, 0 = Rest)
-                        qs,                 # QSDELAY
-                        d if d is not None else "",  # DTEMF
-                        l if l is not None else "",  # LTEMF
-                        overload,           # overload flag
-                        roof_state          # ROOF_STATUS
-                    ]
-
-                    # เขียนไฟล์หลัก (Timer หรือ Manual ปกติ)
-                    main_path = self.csv_name_var.get().strip()
-                    with open(main_path, "a", newline="", encoding="utf-8") as f:
-                        csv.writer(f).writerow(row)
+                    row = self._telemetry_row(s, status_num, qs, d, l, maxv)
 
-                    # ถ้ามีไฟล์ Manual parallel ให้เขียนซ้ำลงไปด้วย
+                    # ไฟล์หลัก (Timer หรือ Manual ปกติ) + ไฟล์ Manual parallel (ถ้ามี)
+                    # sink เปิดไฟล์ค้างไว้และเขียนเป็นชุด; ไฟล์ที่ไม่อยู่ในรายการแล้วจะถูก fsync + ปิด
+                    main_path = self.csv_name_var.get().strip()
                     manual_path = getattr(self, "manual_parallel_path", None)
-                    if manual_path:
-                        try:
-                            os.makedirs(os.path.dirname(manual_path), exist_ok=True)
-
-                            # สร้าง header ไฟล์ manual ครั้งแรก
-                            if self._manual_header_written != manual_path or not os.path.exists(manual_path):
-                                with open(manual_path, "w", newline="", encoding="utf-8") as mf:
-                                    csv.writer(mf).writerow([
-                                        "Date", "Time", "Timezone",
-                                        "STATUS", "QSDELAY", "DTEMF", "LTEMF", "overload", "ROOF_STATUS"
-                                    ])
-                                self._manual_header_written = manual_path
-
-                            with open(manual_path, "a", newline="", encoding="utf-8") as mf:
-                                csv.writer(mf).writerow(row)
-                        except Exception as e2:
-                            self.log(f"บันทึก CSV manual parallel ล้มเหลว: {e2}")
+                    self.tele_sink.write([main_path, manual_path], row)
 
                 except Exception as e:
                     self.log(f"บันทึก CSV ล้มเหลว: {e}")
 
-                for _ in range(int(self.tele_interval_sec * 10)):
-                    if self.tele_stop.is_set():
-                        break
-                    time.sleep(0.1)
+            self.sampler.unsubscribe(sub)
+            if sub.dropped:
+                self.log(f"CSV: ทิ้ง sample {sub.dropped} ค่า (เขียนไฟล์ไม่ทัน)")
+            try:
+                self.tele_sink.close()
+            except Exception as e:
+                self.log(f"ปิดไฟล์ CSV ล้มเหลว: {e}")
             self.log("หยุดเก็บ Telemetry (CSV)")
 
         self.tele_thread = threading.Thread(target=worker, daemon=True)
         self.tele_thread.start()
 
+    def _telemetry_row(self, s, status_num: int, qs: str, d: float | None, l: float | None,
+                       maxv: float | None) -> list:
+        """แถว TELEMETRY_HEADER ของ sample หนึ่งค่า (ไฟล์หลัก, manual parallel, เลเซอร์ตัวอื่น)"""
+        # overload according to LTEMF > max (only when Temp Control is enabled)
+        try:
+            temp_enabled = bool(self.temp_ctl_enabled.get())
+        except Exception:
+            temp_enabled = True
+        overload = (temp_enabled and l is not None and maxv is not None and l > maxv)
+        now = s.wall
+        return [
+            now.strftime("%Y-%m-%d"),       # Date
+            now.strftime("%H:%M:%S"),       # Time
+            now.tzname() or "UTC+7",        # Timezone
+            status_num,                     # STATUS (1 = Fire, 0 = Rest)
+            qs,                             # QSDELAY
+            d if d is not None else "",     # DTEMF
+            l if l is not None else "",     # LTEMF
+            overload,                       # overload flag
+            self._get_roof_status_cached(), # ROOF_STATUS
+            f"{s.slot:.3f}",                # EPOCH (slot บนกริด; Date/Time มาจาก slot เดียวกัน)
+            f"{s.mono:.3f}",                # MONO
+            s.missed,                       # MISSED
+        ]
+
+    def _signal_telemetry_stop(self):
+        """สั่ง worker CSV ตัวปัจจุบันให้หยุด: set stop ของมัน + ปิด subscription ให้ get() ตื่นทันที"""
+        self.tele_stop.set()
+        sub, self._tele_csv_sub = self._tele_csv_sub, None
+        if sub is not None:
+            self.sampler.unsubscribe(sub)
+        th, self.tele_thread = self.tele_thread, None
+        if th and th.is_alive() and th is not threading.current_thread():
+            th.join(timeout=0.5)
+
     def _stop_telemetry(self):
-        if self.tele_thread and self.tele_thread.is_alive():
-            self.tele_stop.set()
-            self.tele_thread.join(timeout=0.5)
-        self.tele_thread = None
-        self.tele_stop.clear()
+        self._signal_telemetry_stop()
+        # เขียนแถวที่ค้าง + fsync (worker ก็ปิดเองตอนจบ ถ้า join ไม่ทัน)
+        try:
+            self.tele_sink.close()
+        except Exception as e:
+            self.log(f"ปิดไฟล์ CSV ล้มเหลว: {e}")
         self.tele_owner_idx = None
 
         # ล้างสถานะ manual parallel
         self.manual_parallel_path = None
-        self._manual_header_written = None
 
-    def _query_float(self, cmd: str) -> float | None:
-        try:
-            if not self.laser:
-                return None
-            # ใช้ non-blocking + timeout สั้น เพื่อลดการกีดขวางคำสั่งควบคุม
-            resp = self.laser.try_send_cmd(cmd, call_timeout=0.6)
-            if resp is None:
-                return None  # BUSY: มีคำสั่งสำคัญใช้งาน socket อยู่ → ข้ามรอบนี้
-            self.msg_q.put(f">> {cmd}\n<< {resp}")
-            m = re.search(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?", resp)
-            return float(m.group(0)) if m else None
-        except Exception:
-            return None
-        
-    def _query_float_quiet(self, cmd: str, timeout_s: float = 0.35) -> float | None:
-        """อ่านค่า float แบบเบา ๆ: non-blocking, quiet (ไม่เขียน log), timeout สั้น เพื่อลดผลกระทบคำสั่งควบคุม"""
+    def _telemetry_state(self) -> str:
+        """สถานะสำหรับ SamplingPolicy (เรียกจาก thread ของ sampler)"""
+        if self.is_firing:
+            return STATE_FIRE
+        if any(v.get("runner") and v["runner"].is_alive() for v in list(self.programs)):
+            return STATE_REST
+        return STATE_IDLE
+
+    def _read_telemetry(self) -> list[str] | None:
+        """อ่านของ TelemetrySampler: DTEMF / LTEMF / STATUS ใน round trip เดียว (pipelined)"""
+        laser = self.laser
+        if not laser:
+            return None  # ยังไม่ต่อ
         try:
-            if not self.laser:
-                return None
-            # เคารพการเว้นช่วงหลังสั่ง FIRE/STANDBY/STOP
-            if time.monotonic() < self.tele_pause_until:
-                return None
-            resp = self.laser.try_send_cmd(cmd, call_timeout=timeout_s)
-            if resp is None:
-                return None  # BUSY → ไม่แย่ง lock กับคำสั่งควบคุม
-            m = re.search(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?", resp)
-            return float(m.group(0)) if m else None
+            return laser.query_many(SAMPLE_CMDS, call_timeout=0.6)  # None = BUSY/stale → ข้ามรอบนี้
         except Exception:
             return None
-       
+
     def _parse_float_safe(self, s: str) -> float | None:
         """ดึงค่าทศนิยมตัวแรกจากสตริง เช่น '$LTEMF=33.2C' -> 33.2"""
         if s is None:
@@ -1787,62 +2020,21 @@ class App(tk.Tk):
         except Exception:
             return None
 
-    def _query_ltemf(self) -> float | None:
-        """คืน LTEMF (°C): พยายาม query แบบเร็ว ถ้า busy ใช้ค่าล่าสุดจาก telemetry"""
-        # 1) ถ้า telemetry เพิ่งอัปเดต มีค่าล่าสุด ใช้เลยเพื่อลดชนกับคำสั่งควบคุม
-        if self.last_ltemf is not None and (time.monotonic() >= self.tele_pause_until):
-            return self.last_ltemf
-        # 2) ลองถามแบบ timeout สั้น
-        try:
-            if not self.laser:
-                return None
-            resp = self.laser.try_send_cmd("$LTEMF ?", call_timeout=0.6)
-            if resp is None:
-                return self.last_ltemf  # busy → คืนค่าล่าสุดที่มี
-            m = re.search(r"[-+]?\d+(?:\.\d+)?", resp)
-            return float(m.group(0)) if m else self.last_ltemf
-        except Exception:
-            return self.last_ltemf
+    def _query_ltemf(self, dev_id: str = DEFAULT_DEVICE) -> float | None:
+        """LTEMF (°C) ของ sample ใหม่ล่าสุดจาก sampler ของ dev_id; None ถ้ายังไม่มี sample ใหม่ตั้งแต่รอบก่อน"""
+        sub = self._temp_subs.get(dev_id)
+        samples = sub.drain() if sub else []
+        return samples[-1].ltemf if samples else None
 
     def _temp_monitor_tick(self):
-        """เช็คอุณหภูมิเป็นระยะ ถ้าเกิน max -> STANDBY + popup (CSV ยังทำงานต่อ)"""
+        """เช็คอุณหภูมิเลเซอร์ทุกตัวเป็นระยะ ถ้าเกิน max -> STANDBY ตัวนั้น + ปิดหลังคา + popup (CSV ยังทำงานต่อ)"""
         try:
             if self.temp_ctl_enabled.get():
-                val = self._query_ltemf()
-                if val is not None:
-                    maxv = float(self.max_temp_var.get())
-                    hysteresis = 0.3  # กันเด้งซ้ำ
-
-                    if val > maxv and not self._temp_alarm_active:
-                        # ทริกครั้งแรก: ตั้งธง ป้องกันแจ้งซ้ำ
-                        self._temp_alarm_active = True
-
-                        # ✅ สั่ง STANDBY แบบ "ไม่หยุด CSV"
-                        # (อย่าเรียก cmd_standby() เพราะมันหยุด CSV)
-                        with self.manual_lock:
-                            self.is_firing = False
-                        self._append_status_point(0)
-                        self._send("$STANDBY")
-
-                        delay_ms = 5000
-                        self.log(f"Over-Temp: LTEMF={val:.2f} > Max={maxv:.2f} → STANDBY, will close roof in {delay_ms/1000:.1f}s")
-                        self.after(delay_ms, lambda: self._delayed_roof_close())   
-
-                        # แจ้งเตือน
-                        # self.log(f"Over-Temp: LTEMF={val:.2f} > Max={maxv:.2f} → STANDBY (CSV continues)")
-                        try:
-                            messagebox.showwarning(
-                                "Over-Temperature",
-                                f"LTEMF = {val:.2f} °C > Max {maxv:.2f} °C\nSTANDBY sent (CSV continues)."
-                            )
-                        except Exception:
-                            print(f"Over-Temperature: LTEMF={val:.2f} °C > {maxv:.2f} °C (STANDBY sent)")
-
-                    elif val <= (maxv - hysteresis) and self._temp_alarm_active:
-                        # อุณหภูมิลดลงพอแล้ว: เคลียร์ธงเพื่อให้แจ้งได้อีกครั้งหากเกินซ้ำ
-                        self._temp_alarm_active = False
+                maxv = float(self.max_temp_var.get())
+                for dev_id in self.pool.ids():
+                    self._check_overtemp(dev_id, maxv)
             else:
-                self._temp_alarm_active = False
+                self._temp_alarm = dict.fromkeys(self.pool.ids(), False)
                 try:
                     self._ui_call(self._hide_overheat_popup)
                 except Exception:
@@ -1853,9 +2045,46 @@ class App(tk.Tk):
             except Exception:
                 self.after(1000, self._temp_monitor_tick)
 
+    def _check_overtemp(self, dev_id: str, maxv: float):
+        val = self._query_ltemf(dev_id)
+        if val is None:
+            return
+        hysteresis = 0.3  # กันเด้งซ้ำ
+        name = "" if dev_id == DEFAULT_DEVICE else f"Laser {dev_id} "
+        active = self._temp_alarm.get(dev_id, True)
+
+        if val > maxv and not active:
+            # ทริกครั้งแรก: ตั้งธง ป้องกันแจ้งซ้ำ
+            self._temp_alarm[dev_id] = True
+
+            # ✅ สั่ง STANDBY แบบ "ไม่หยุด CSV"
+            # (อย่าเรียก cmd_standby() เพราะมันหยุด CSV)
+            with self.manual_lock:
+                self.firing_devices.discard(dev_id)
+            if dev_id == DEFAULT_DEVICE:
+                self._append_status_point(0)
+            self._send_to(dev_id, "$STANDBY")
+
+            delay_ms = 5000
+            self.log(f"{name}Over-Temp: LTEMF={val:.2f} > Max={maxv:.2f} → STANDBY, will close roof in {delay_ms/1000:.1f}s")
+            self.after(delay_ms, lambda: self._delayed_roof_close(force=True))
+
+            # แจ้งเตือน
+            try:
+                messagebox.showwarning(
+                    "Over-Temperature",
+                    f"{name}LTEMF = {val:.2f} °C > Max {maxv:.2f} °C\nSTANDBY sent (CSV continues)."
+                )
+            except Exception:
+                print(f"{name}Over-Temperature: LTEMF={val:.2f} °C > {maxv:.2f} °C (STANDBY sent)")
+
+        elif val <= (maxv - hysteresis) and active:
+            # อุณหภูมิลดลงพอแล้ว: เคลียร์ธงเพื่อให้แจ้งได้อีกครั้งหากเกินซ้ำ
+            self._temp_alarm[dev_id] = False
+
     # ---------- Logs & clock ----------
-    def clear_terminal(self): self.log_text.delete("1.0", tk.END)
-    def clear_sched_terminal(self): self.sched_log_text.delete("1.0", tk.END)
+    def clear_terminal(self): self.log_pane.clear()
+    def clear_sched_terminal(self): self.sched_log_pane.clear()
 
     def log(self, msg: str):
         stamp = datetime.now(TZ).strftime("%H:%M:%S")
@@ -1866,35 +2095,23 @@ class App(tk.Tk):
         self.msg_q.put(f"[SCHED#{idx+1}] [{stamp}] {msg}")
 
     def _drain_logs(self):
+        # ดึงจากคิวทีละชุด (ไม่เกิน LOG_BATCH_MAX ต่อรอบ เพื่อไม่ให้ Tk ค้างตอนข้อความท่วม) แล้ว insert ครั้งเดียวต่อ widget
+        main, sched = [], []
         try:
-            while True:
+            for _ in range(self.LOG_BATCH_MAX):
                 msg = self.msg_q.get_nowait()
-                if msg.startswith("[SCHED#"):
-                    self.sched_log_text.insert(tk.END, msg + "\n"); self.sched_log_text.see(tk.END)
-                else:
-                    self.log_text.insert(tk.END, msg + "\n"); self.log_text.see(tk.END)
+                (sched if msg.startswith("[SCHED#") else main).append(msg)
         except queue.Empty:
             pass
+        self.log_pane.write(main)
+        self.sched_log_pane.write(sched)
         self.after(200, self._drain_logs)
 
     def _update_clock_and_plot(self):
-        # อัปเดตเส้นกราฟ
-        self.line_status.set_data(self.line_x, self.line_y)
-        if self.line_x:
-            self.ax1.set_xlim(self.line_x[0], self.line_x[-1] + timedelta(seconds=5))
-        self.line_dtemf.set_data(self.tele_x, self.tele_d)
-        self.line_ltemf.set_data(self.tele_x, self.tele_l)
-        if self.tele_x:
-            self.ax2.set_xlim(self.tele_x[0], self.tele_x[-1] + timedelta(seconds=5))
-            vals = [v for v in (self.tele_d + self.tele_l) if v == v]
-            if vals:
-                ymin, ymax = min(vals), max(vals)
-                if ymin == ymax: ymin -= 1; ymax += 1
-                pad = (ymax - ymin) * 0.1
-                self.ax2.set_ylim(ymin - pad, ymax + pad)
-        self.canvas.draw_idle()
-
-        # จุดสถานะ (อัพเดตทุกวินาที)
+        # อัปเดตเส้นกราฟ (ขยับแกน/วาดใหม่ทั้งหมดเฉพาะเมื่อข้อมูลหลุดกรอบ)
+        self.live_plot.render(*self._chart_view())
+
+        # ยืดเส้นสถานะถึงปัจจุบัน (และจับการเปลี่ยน is_firing ที่ไม่ได้ผ่าน _append_status_point)
         with self.manual_lock:
             y = 1 if self.is_firing else 0
         self._append_status_point(y)
@@ -2230,25 +2447,36 @@ class App(tk.Tk):
                 if v["manager_stop"].is_set():
                     break
 
-                # ===== ถึงเวลาเริ่มแล้ว ค่อย claim active program =====
+                # ===== ถึงเวลาเริ่มแล้ว ค่อย claim active program (ต่อเลเซอร์หนึ่งตัว) =====
+                dev_id = self._device_of(v)
+                primary = dev_id == DEFAULT_DEVICE
                 with self.active_program_lock:
-                    if self.active_program_idx is None:
-                        self.active_program_idx = idx
-                    elif self.active_program_idx != idx:
-                        self._sched_log(idx, f"Blocked: active program = P{self.active_program_idx+1}")
-                        self._ui_update_prog(idx, 0, 0, f"Blocked (Active=P{self.active_program_idx+1})")
-
-                        time.sleep(1.0)
-                        continue
+                    owner = self.active_by_device.get(dev_id)
+                    if owner is None:
+                        self.active_by_device[dev_id] = owner = idx
+                        if primary:
+                            self.active_program_idx = idx
+                if owner != idx:
+                    self._sched_log(idx, f"Blocked: {dev_id} active program = P{owner+1}")
+                    self._ui_update_prog(idx, 0, 0, f"Blocked (Active=P{owner+1})")
+
+                    time.sleep(1.0)
+                    continue
 
                 # ===== เริ่ม CSV/telemetry ของโปรแกรมนี้ (หลัง claim active เท่านั้น) =====
                 stamp = s_dt.strftime('%Y%m%d_%H%M%S')
-                csvname = os.path.join(getattr(self, "log_dir", LOG_DIR), f"telemetry_sched_P{idx+1}_{stamp}.csv")
-                self.csv_name_var.set(csvname)
-                self.record_var.set(True)
-                self._start_telemetry()
-                self.tele_owner_idx = idx
-                self._sched_log(idx, f"CSV START → {csvname}")
+                if primary:
+                    csvname = os.path.join(getattr(self, "log_dir", LOG_DIR), f"telemetry_sched_P{idx+1}_{stamp}.csv")
+                    self.csv_name_var.set(csvname)
+                    self.record_var.set(True)
+                    self._start_telemetry()
+                    self.tele_owner_idx = idx
+                    self._sched_log(idx, f"CSV START → {csvname}")
+                else:
+                    # เลเซอร์ตัวอื่น: telemetry มาจาก sampler ของตัวมันเอง (ไฟล์ telemetry_<device>_<date>.csv)
+                    self._sched_log(idx, f"Laser {dev_id} → telemetry by its own sampler")
+                # เวลาส่ง/ack ของ FIRE/STANDBY แต่ละรอบ (ดู jitter ของ fire_ms/rest_ms)
+                timing_csv = os.path.join(getattr(self, "log_dir", LOG_DIR), f"timing_sched_P{idx+1}_{stamp}.csv")
 
                 # one-shot ของช่วงนี้
                 local_stop = threading.Event()
@@ -2258,14 +2486,11 @@ class App(tk.Tk):
                 def on_fire():
                     nonlocal done
 
-                    # หน่วงป้อง telemetry overlap
-                    self.tele_pause_until = time.monotonic() + 1.5
-
                     # --- SAFETY INTERLOCK: Roof ต้อง ON เท่านั้น ---
                     if not self._guard_fire_by_roof():
                         # บล็อกการยิง: ต้องทำให้สถานะกลับไปเป็นไม่ยิงด้วย
                         with self.manual_lock:
-                            self.is_firing = False
+                            self.firing_devices.discard(dev_id)
 
                         # อัปเดต UI/กราฟสถานะผ่าน main thread
                         try:
@@ -2277,9 +2502,16 @@ class App(tk.Tk):
                         # ไม่เพิ่ม done และไม่ยิง
                         return
 
+                    # --- ลิงก์หลุดอยู่: รอ reconnect สั้น ๆ (ถ้าไม่ทัน _on_link_state จะยิงให้เมื่อกลับมา) ---
+                    laser = self.pool.client(dev_id)
+                    if laser and not laser.connected:
+                        self._sched_log(idx, "Laser link down → waiting for reconnect before FIRE")
+                        if not laser.wait_connected(timeout=5.0):
+                            self._sched_log(idx, "Link still down → FIRE deferred until reconnect")
+
                     # --- ผ่าน interlock แล้ว ค่อยยิง ---
                     with self.manual_lock:
-                        self.is_firing = True
+                        self.firing_devices.add(dev_id)
 
                     done += 1
                     # (UI update ควรผ่าน after เพื่อชัวร์ว่าอยู่ main thread)
@@ -2290,15 +2522,29 @@ class App(tk.Tk):
                         pass
 
                     # self._send("$FIRE")
-                    self._safe_fire()
+                    fut = self._safe_fire_at(fr.phase_at, device=dev_id)
+                    if fut is not None:
+                        self._record_cycle_timing(idx, timing_csv, done, fut)
+                        # ยืนยันจาก $STATUS ว่าเลเซอร์เข้า FIRE จริง (ไม่เชื่อแค่ is_firing)
+                        # poll บน I/O loop แล้วรายงานผ่าน msg_q → ไม่บล็อก thread ของ scheduler
+                        t0 = time.monotonic()
+
+                        def _confirmed(f, t0=t0):
+                            st = None if f.cancelled() or f.exception() else f.result()
+                            if st is not None:
+                                self._sched_log(idx, f"FIRE confirmed by $STATUS in {(st.ts - t0) * 1000:.0f} ms")
+                            else:
+                                self._sched_log(idx, "⚠ FIRE not confirmed by $STATUS within 1.5 s")
 
+                        try:
+                            laser.confirm_mode_async("FIRE", timeout=1.5).add_done_callback(_confirmed)
+                        except RuntimeError:
+                            pass  # ลิงก์หลุดระหว่างนี้ → _on_link_state จัดการยิงใหม่
 
-                def on_rest(is_last: bool = False):
-                    # หน่วงป้อง telemetry overlap
-                    self.tele_pause_until = time.monotonic() + 1.5
 
+                def on_rest(is_last: bool = False):
                     with self.manual_lock:
-                        self.is_firing = False
+                        self.firing_devices.discard(dev_id)
 
                     # ---------- UI ----------
                     status_txt = f"Resting ({done}/{total})"
@@ -2317,8 +2563,15 @@ class App(tk.Tk):
                         pass
 
 
-                    # ---------- ส่งคำสั่งเลเซอร์พัก ----------
-                    self._send("$STANDBY")
+                    # ---------- ส่งคำสั่งเลเซอร์พัก (ตรงเวลาขอบช่วง REST) ----------
+                    try:
+                        fut = self._send_at(dev_id, "$STANDBY", fr.phase_at)
+                    except Exception:
+                        fut = None
+                    if fut is not None:
+                        self._record_cycle_timing(idx, timing_csv, done, fut)
+                    else:
+                        self._send_to(dev_id, "$STANDBY")
 
                     # ---------- postrest เหมือนเดิม (delay +3s เปิด/ปิดตามระบบคุณ) ----------
                     # ❗ คุณต้องการให้ final rest ก็มี postrest เช่นกัน
@@ -2329,7 +2582,7 @@ class App(tk.Tk):
                         self._sched_log(idx, "FINAL REST → roof close scheduled")
                         try:
                             # ปรับตามฟังก์ชันปิดหลังคาที่คุณใช้จริง
-                            self._schedule_roof_close_if_open()
+                            self._schedule_roof_close_if_open("final REST", idx)
                         except Exception as e:
                             self._sched_log(idx, f"roof close error: {e}")
                         return   # ❗ ห้ามตั้ง prefire ต่อ
@@ -2360,6 +2613,9 @@ class App(tk.Tk):
                 self._cancel_api_timers_for(idx)    # << ใส่บรรทัดนี้
 
 
+                with self.manual_lock:
+                    self.firing_devices.discard(dev_id)
+
                 # ปิด CSV ถ้ายังเป็นของโปรแกรมนี้
                 if self.tele_owner_idx == idx:
                     self._stop_telemetry()
@@ -2369,9 +2625,7 @@ class App(tk.Tk):
                 v["active_thread"] = None
                 v["oneshot_stop"] = None
 
-                with self.active_program_lock:
-                    if self.active_program_idx == idx:
-                        self.active_program_idx = None
+                self._release_active(idx)
 
                 # ตรวจโหมดโปรแกรมปัจจุบัน
                 mode_now = self.programs[idx]["mode"].get().lower() if (0 <= idx < len(self.programs)) else "once"
@@ -2464,25 +2718,26 @@ class App(tk.Tk):
 
         # 4) บังคับ STANDBY และเคลียร์สถานะในแอป
         try:
-            self._send("$STANDBY")
+            self._send_to(self._device_of(v), "$STANDBY")
             self._sched_log(idx, "Force → $STANDBY")
         except Exception as e:
             self._sched_log(idx, f"Force STANDBY failed: {e}")
 
+        dev_id = self._device_of(v)
+        with self.manual_lock:
+            self.firing_devices.discard(dev_id)
+        if dev_id == DEFAULT_DEVICE:
+            self._append_status_point(0)
+
+        self._release_active(idx)
+
+        # ปิดหลังคาหลังปล่อยเลเซอร์ตัวนี้แล้ว → ถ้ายังมีตัวอื่นยิง/มีโปรแกรมอยู่ _schedule_roof_close_if_open จะข้าม
         if not getattr(self, "_batch_stopping", False):
             try:
                 self._schedule_roof_close_if_open("Stop Program")
             except Exception:
                 pass
 
-        with self.manual_lock:
-            self.is_firing = False
-        self._append_status_point(0)
-
-        with self.active_program_lock:
-            if self.active_program_idx == idx:
-                self.active_program_idx = None
-
         self._set_program_editable(v, True)
         self._sched_log(idx, "Program unlocked (Stop)")
 
@@ -2521,6 +2776,7 @@ class App(tk.Tk):
 
         with self.active_program_lock:
             self.active_program_idx = None
+            self.active_by_device.clear()
 
         # หลังจากหยุดหมดแล้ว ถ้าหลังคายังเปิดอยู่ → สั่งปิดหลัง 5 วินาที
         try:
@@ -2560,6 +2816,16 @@ class App(tk.Tk):
                 "safety_fire_enabled": bool(self._is_safety_fire_enabled()),
                 "prefire_open_sec": float(getattr(self, "roof_preopen_sec", 15)),
                 "postrest_close_sec": float(getattr(self, "roof_postclose_sec", 3)),
+                "record_session": bool(self.record_session),
+                "csv_flush_rows": self.tele_sink.flush_rows,
+                "csv_flush_sec": self.tele_sink.flush_sec,
+                "tele_rates": self.sampler.policy.to_dict(),
+                "chart_backend": self.chart_backend,
+                "chart_window": self.chart_window,
+                "chart_seed_hours": self.chart_seed_hours,
+                "log_max_lines": self.log_max_lines,
+                # เลเซอร์ตัวอื่นนอกจาก DEFAULT_DEVICE (id/host/port/user)
+                "devices": [c.to_dict() for c in self.pool.configs() if c.device_id != DEFAULT_DEVICE],
                 "programs": []
             }
             for v in self.programs:
@@ -2571,7 +2837,7 @@ class App(tk.Tk):
                     "end": v["end"].get(),
                     "fire_ms": self._minutes_text_to_ms(v["fire_ms"].get()),
                     "rest_ms": self._minutes_text_to_ms(v["rest_ms"].get()),
-
+                    "device": self._device_of(v),
                 }
                 if item["mode"] == "once":
                     item["once_date"] = v["once_date"].get()
@@ -2606,6 +2872,15 @@ class App(tk.Tk):
             self.qsdelay_var.set(data.get("qsdelay", self.qsdelay_var.get()))
             self.freq_var.set(data.get("freq", self.freq_var.get()))
 
+            # ---------- เลเซอร์ตัวอื่น ๆ ใน pool ----------
+            for d in data.get("devices", []):
+                try:
+                    cfg = DeviceConfig.from_dict(d)
+                    if cfg.device_id != DEFAULT_DEVICE:
+                        self.pool.add(cfg)
+                except Exception as e:
+                    self.log(f"device config ผิดรูปแบบ {d}: {e}")
+
             # ---------- API / Logs tab ----------
             self.roof_api_base = data.get(
                 "roof_api_base",
@@ -2621,6 +2896,18 @@ class App(tk.Tk):
             )
             self.roof_preopen_sec = float(data.get("prefire_open_sec", getattr(self, "roof_preopen_sec", 15)))
             self.roof_postclose_sec = float(data.get("postrest_close_sec", getattr(self, "roof_postclose_sec", 3)))
+            self.record_session = bool(data.get("record_session", False))
+            self.tele_sink.flush_rows = max(1, int(data.get("csv_flush_rows", self.tele_sink.flush_rows)))
+            self.tele_sink.flush_sec = float(data.get("csv_flush_sec", self.tele_sink.flush_sec))
+            try:
+                self.sampler.policy.update(data.get("tele_rates") or {})
+            except (TypeError, ValueError) as e:
+                self.log(f"Settings: tele_rates ignored ({e}), using {self.sampler.policy.to_dict()}")
+            self._set_chart_backend(str(data.get("chart_backend", self.chart_backend)), save=False)
+            self._set_chart_window(str(data.get("chart_window", self.chart_window)), save=False)
+            self.chart_seed_hours = float(data.get("chart_seed_hours", self.chart_seed_hours))
+            self.log_max_lines = max(100, int(data.get("log_max_lines", self.log_max_lines)))
+            self.log_pane.max_lines = self.sched_log_pane.max_lines = self.log_max_lines
 
             # sync vars (กรณี UI tab 2 ถูก build แล้ว)
             if hasattr(self, "roof_api_base_var"):
@@ -2720,7 +3007,15 @@ class App(tk.Tk):
         except Exception:
             pass
 
-    def _schedule_roof_close_if_open(self, reason: str = ""):
+    def _lasers_needing_roof(self, idx: int | None = None) -> list[str]:
+        """device ที่กำลังยิง หรือมีโปรแกรมอื่น (ไม่ใช่ idx) ครองอยู่ → ยังปิดหลังคาอัตโนมัติไม่ได้"""
+        with self.manual_lock:
+            busy = set(self.firing_devices)
+        with self.active_program_lock:
+            busy.update(d for d, owner in self.active_by_device.items() if owner != idx)
+        return sorted(busy)
+
+    def _schedule_roof_close_if_open(self, reason: str = "", idx: int | None = None):
         # """
         # ปิดหลังคาอัตโนมัติหลัง 5 วินาที ถ้า roof_auto_ctrl_var = True เท่านั้น
         # """
@@ -2729,6 +3024,11 @@ class App(tk.Tk):
             self.log(f"Auto roof OFF → ไม่ปิดหลังคาอัตโนมัติ ({reason})")
             return
 
+        busy = self._lasers_needing_roof(idx)
+        if busy:
+            self.log(f"Roof kept OPEN after {reason}: {', '.join(busy)} still active/firing")
+            return
+
         try:
             state = self._get_roof_status_cached()
         except Exception:
@@ -2740,7 +3040,7 @@ class App(tk.Tk):
             except Exception:
                 pass
             try:
-                self.after(5000, lambda: self._delayed_roof_close())
+                self.after(5000, lambda: self._delayed_roof_close(idx))
             except Exception as e:
                 try:
                     self.log(f"schedule roof_close failed ({reason}): {e}")
@@ -2749,8 +3049,13 @@ class App(tk.Tk):
         else:
             self.log(f"Roof already closed ({state}) → ไม่ต้องสั่งปิด ({reason})")
 
-    def _delayed_roof_close(self):
+    def _delayed_roof_close(self, idx: int | None = None, force: bool = False):
         # """เรียกปิดหลังคาหลังหน่วงเวลา"""
+        # force=True (เช่น Over-Temp): ปิดเสมอ ไม่สนว่ายังมีโปรแกรมครองเลเซอร์อยู่ — หลังคาปิดคือสิ่งที่กันการ FIRE รอบถัดไป
+        busy = [] if force else self._lasers_needing_roof(idx)
+        if busy:
+            self.log(f"Delayed roof_close skipped: {', '.join(busy)} started meanwhile")
+            return
         try:
             self.log("Executing delayed roof_close ...")
             self.roof_close()
@@ -2817,8 +3122,13 @@ class App(tk.Tk):
         if not self.roof_auto_sched_var.get():
             return
         def _go():
-            if self.roof_auto_sched_var.get():
-                self._external_off()
+            if not self.roof_auto_sched_var.get():
+                return
+            busy = self._lasers_needing_roof(idx)
+            if busy:
+                self._sched_log(idx, f"postrest: roof kept OPEN, {', '.join(busy)} still active/firing")
+                return
+            self._external_off()
         t = threading.Timer(float(getattr(self, "roof_postclose_sec", 3)), _go)
         t.daemon = True
         t.start()
@@ -2837,7 +3147,10 @@ class App(tk.Tk):
             # self._roof_poll_stop.set()
             self.stop_all_programs()
             self._stop_telemetry()
-            if self.laser: self.laser.close()
+            self.sampler.stop()
+            self._timing_q.put(None)
+            # ให้ $STANDBY ที่ค้างในคิวออกไปก่อนปิด socket (ทุกเลเซอร์)
+            self.pool.close_all()
         except Exception:
             pass
         self.destroy()
@@ -2997,12 +3310,12 @@ class App(tk.Tk):
 
         return True
   
-    def _safe_fire(self) -> bool:
+    def _safe_fire(self, device: str = DEFAULT_DEVICE) -> bool:
         # """เรียกยิงแบบมีการ์ด ตรวจ Roof ก่อนเสมอ"""
         if not self._guard_fire_by_roof():
             return False
         try:
-            self._send("$FIRE")  # ← ตรงนี้คือคำสั่งยิงเลเซอร์เดิมของคุณ
+            self._send_to(device, "$FIRE")  # ← ตรงนี้คือคำสั่งยิงเลเซอร์เดิมของคุณ
             return True
         except Exception as e:
             try:
@@ -3017,6 +3330,64 @@ class App(tk.Tk):
                 pass
             return False
 
+    def _safe_fire_at(self, at: float, device: str = DEFAULT_DEVICE):
+        """
+        ยิงตามรอบ: ตรวจ Roof ก่อน แล้ว $FIRE ตรงเวลา at (time.monotonic) → Future[CommandTiming]
+        None = ไม่ได้ตั้งเวลา (roof guard ไม่ผ่าน หรือเลเซอร์ไม่ได้เชื่อมต่อ → ส่งผ่าน _send_to ทันทีแทน)
+        """
+        if not self._guard_fire_by_roof():
+            return None
+        try:
+            fut = self._send_at(device, "$FIRE", at)
+        except RuntimeError:
+            fut = None  # ลิงก์หลุดพอดี
+        if fut is None:
+            self._send_to(device, "$FIRE")
+        return fut
+
+    def _record_cycle_timing(self, idx: int, path: str, cycle: int, fut):
+        """บันทึก CommandTiming ของ FIRE/STANDBY ตามรอบลง sched log + CSV (เรียกเมื่อ Future เสร็จ)"""
+        # done-callback รันบน shared I/O loop → ห้ามทำ disk I/O ตรงนี้ แค่ส่งต่อให้ _timing_worker
+        fut.add_done_callback(lambda f: self._timing_q.put((idx, path, cycle, f)))
+
+    def _timing_worker(self):
+        """เขียน timing_sched_*.csv: CsvSink เปิดค้างไว้ต่อไฟล์ ปิดเมื่อไม่มีแถวใหม่เกิน 60 วิ (None = ปิดทั้งหมดแล้วจบ)"""
+        sinks: dict[str, CsvSink] = {}
+        last_row: dict[str, float] = {}
+        while True:
+            try:
+                item = self._timing_q.get(timeout=1.0)
+            except queue.Empty:
+                now = time.monotonic()
+                for path in [p for p, t in last_row.items() if now - t > 60.0]:
+                    del last_row[path]
+                    sinks.pop(path).close()
+                for sink in sinks.values():
+                    sink.flush_if_due()
+                continue
+            if item is None:
+                for sink in sinks.values():
+                    sink.close()
+                return
+            idx, path, cycle, f = item
+            try:
+                t = f.result()
+            except Exception as e:
+                self._sched_log(idx, f"timed command failed: {e}")
+                continue
+            self.msg_q.put(f">> {t.cmd}\n<< {t.reply}")
+            ack = "-" if t.ack_ms is None else f"{t.ack_ms:.1f}"
+            self._sched_log(idx, f"#{cycle} {t.cmd} sent {t.lateness_ms:+.1f} ms vs schedule, ack {ack} ms")
+            try:
+                now = datetime.now(TZ)
+                sink = sinks.get(path) or sinks.setdefault(path, CsvSink(TIMING_HEADER, flush_rows=10, flush_sec=5.0))
+                sink.write([path], [now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S.%f")[:-3], now.tzname() or "UTC+7",
+                                    cycle, t.cmd, f"{t.lateness_ms:.2f}",
+                                    "" if t.ack_ms is None else f"{t.ack_ms:.2f}", t.reply])
+                last_row[path] = time.monotonic()
+            except Exception as e:
+                self._sched_log(idx, f"timing CSV error: {e}")
+
     def _wait_roof_on(self, timeout: float = 12.0, interval: float = 0.5) -> bool:
         deadline = time.monotonic() + timeout
         last = None
@@ -3033,8 +3404,8 @@ class App(tk.Tk):
 
     def _monitor_roof_during_fire(self):
         try:
-            # ถ้าไม่ได้กำลังยิง ไม่ต้องตรวจ
-            if not getattr(self, "is_firing", False):
+            # ถ้าไม่ได้กำลังยิง (ทุกเลเซอร์) ไม่ต้องตรวจ
+            if not self.firing_devices:
                 self.after(1000, self._monitor_roof_during_fire)
                 return
 
@@ -3049,12 +3420,15 @@ class App(tk.Tk):
             if state == "OFF":
                 # หยุดเลเซอร์ทันที
                 try:
-                    self.tele_pause_until = time.monotonic() + 1.5
+                    # หยุดเฉพาะเลเซอร์ที่กำลังยิงอยู่จริง ตัวที่ว่าง/พักอยู่ไม่ต้องแตะ
                     with self.manual_lock:
-                        self.is_firing = False
+                        firing = set(self.firing_devices)
+                        self.firing_devices.clear()
 
-                    self.after(0, lambda: self._append_status_point(0))
-                    self._send("$STANDBY")
+                    if DEFAULT_DEVICE in firing:
+                        self.after(0, lambda: self._append_status_point(0))
+                    for dev_id in sorted(firing):
+                        self._send_to(dev_id, "$STANDBY")
 
                     self.log("⚠ Roof ปิดขณะยิง → สั่งหยุดเลเซอร์ทันที")
                     self.after(
@@ -1,51 +1,1176 @@
 # laser_client.py
 from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import re
 import socket
 import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+
+# ลำดับความสำคัญของคำสั่ง (เลขน้อย = ส่งก่อน)
+PRIO_SAFETY = 0      # $STOP / $STANDBY / $FIRE
+PRIO_CONTROL = 1     # $LOGIN, $QSDELAY <n>, $DFREQ <n>, ...
+PRIO_TELEMETRY = 2   # queries ("... ?")
+
+SAFETY_CMDS = ("$STOP", "$STANDBY", "$FIRE")
+
+# หนึ่ง sample ของ telemetry (ส่งต่อกันใน round trip เดียว)
+SAMPLE_CMDS = ("$DTEMF ?", "$LTEMF ?", "$STATUS ?")
+
+# สถานะของลิงก์ (ส่งให้ state listener)
+STATE_CONNECTED = "CONNECTED"
+STATE_RECONNECTING = "RECONNECTING"
+STATE_CLOSED = "CLOSED"
+
+
+def command_priority(cmd: str) -> int:
+    """Default priority of a command line, e.g. '$STANDBY' -> PRIO_SAFETY."""
+    s = cmd.strip()
+    head = s.split(None, 1)[0].upper() if s else ""
+    if head in SAFETY_CMDS:
+        return PRIO_SAFETY
+    if s.endswith("?"):
+        return PRIO_TELEMETRY
+    return PRIO_CONTROL
+
+
+class StaleCommand(Exception):
+    """The command's deadline passed while it was still queued; it was never sent."""
+
+
+# ชื่อบิตของ status word (นับจาก MSB ของ word 32 บิต, bit 31 = 0x80000000)
+# บิตที่ไม่รู้ความหมายจะใช้ชื่อ "B<n>"
+STATUS_BITS = {
+    31: "FIRE",
+    30: "STANDBY",
+    24: "NOT_READY",
+}
+MODE_BITS = ("FIRE", "STANDBY")
+
+
+@dataclass(frozen=True)
+class LaserStatus:
+    """Decoded '$STATUS' word."""
+    word: int                  # normalised to 32 bits
+    mode: str                  # FIRE / STANDBY / STOP
+    ready: bool
+    flags: frozenset[str]      # every set bit other than mode/ready, by name
+    ts: float = 0.0            # time.monotonic() when the reply arrived
+
+    @property
+    def label(self) -> str:
+        return f"{self.mode} ({'Ready' if self.ready else 'Not Ready'})"
+
+
+def decode_status(resp: str | None, ts: float = 0.0) -> LaserStatus | None:
+    """'$STATUS 80000000' -> LaserStatus; None if unreadable."""
+    if not resp:
+        return None
+    parts = resp.split()
+    if len(parts) < 2:
+        return None
+    digits = parts[1][:8]
+    try:
+        word = int(digits, 16)
+    except ValueError:
+        return None
+    word <<= 4 * (8 - len(digits))  # "80" -> 0x80000000 (byte แรกอยู่บนสุดเสมอ)
+
+    names = {STATUS_BITS.get(b, f"B{b}") for b in range(32) if word >> b & 1}
+    if "FIRE" in names:
+        mode = "FIRE"
+    elif "STANDBY" in names:
+        mode = "STANDBY"
+    else:
+        mode = "STOP"
+    flags = frozenset(names - set(MODE_BITS) - {"NOT_READY"})
+    return LaserStatus(word, mode, "NOT_READY" not in names, flags, ts)
+
+
+def parse_reply_float(resp: str | None) -> float | None:
+    """First number in a reply, e.g. '$LTEMF 33.2' -> 33.2; None if there is none."""
+    m = re.search(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?", resp or "")
+    return float(m.group(0)) if m else None
+
+
+@dataclass(frozen=True)
+class StatusEvent:
+    """One change between consecutive status samples."""
+    kind: str                  # EV_MODE / EV_READY / EV_FLAG_SET / EV_FLAG_CLEARED
+    old: object
+    new: object
+    status: LaserStatus
+
+
+EV_MODE = "MODE"
+EV_READY = "READY"
+EV_FLAG_SET = "FLAG_SET"
+EV_FLAG_CLEARED = "FLAG_CLEARED"
+
+
+def diff_status(prev: LaserStatus | None, cur: LaserStatus) -> list[StatusEvent]:
+    if prev is None:
+        return [StatusEvent(EV_MODE, None, cur.mode, cur)]
+    events = []
+    if prev.mode != cur.mode:
+        events.append(StatusEvent(EV_MODE, prev.mode, cur.mode, cur))
+    if prev.ready != cur.ready:
+        events.append(StatusEvent(EV_READY, prev.ready, cur.ready, cur))
+    for f in sorted(cur.flags - prev.flags):
+        events.append(StatusEvent(EV_FLAG_SET, None, f, cur))
+    for f in sorted(prev.flags - cur.flags):
+        events.append(StatusEvent(EV_FLAG_CLEARED, f, None, cur))
+    return events
+
+
+class StatusTracker:
+    """
+    Keeps the latest LaserStatus and turns consecutive samples into StatusEvents.
+    Subscribers are called as fn(event) on the thread that fed the sample
+    (the client's I/O thread), so they must not block.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.last: LaserStatus | None = None
+        self._subs: list = []
+
+    def subscribe(self, fn) -> None:
+        self._subs.append(fn)
+
+    def unsubscribe(self, fn) -> None:
+        try:
+            self._subs.remove(fn)
+        except ValueError:
+            pass
+
+    def feed(self, st: LaserStatus) -> list[StatusEvent]:
+        with self._lock:
+            events = diff_status(self.last, st)
+            self.last = st
+        for ev in events:
+            for fn in list(self._subs):
+                try:
+                    fn(ev)
+                except Exception:
+                    pass
+        return events
+
+
+def reply_head(line: str) -> str:
+    """'$LTEMF 33.2' / '$LTEMF=33.2C' / '$LTEMF ?' -> '$LTEMF' ('' if not a $-line)."""
+    if not line.startswith("$"):
+        return ""
+    return re.split(r"[\s=?]", line, 1)[0].upper()
+
+
+def _enable_keepalive(sock, idle: int = 5, interval: int = 2, count: int = 3) -> None:
+    """Turn on TCP keepalive so a silently dead link is noticed in ~idle+interval*count s."""
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, idle)
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, interval)
+        if hasattr(socket, "TCP_KEEPCNT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, count)
+    except OSError:
+        pass
+
+
+class LineReader:
+    """
+    Persistent receive buffer for a newline-framed stream.
+    Bytes after the first newline are kept for the next pop_line(), so split
+    or coalesced replies never desync the request/reply pairing.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._scan = 0  # ตำแหน่งที่หา b"\n" ไปแล้ว (ไม่ต้องสแกนซ้ำ)
+
+    def feed(self, data) -> None:
+        self._buf += data
+
+    def pop_line(self) -> bytes | None:
+        i = self._buf.find(b"\n", self._scan)
+        if i < 0:
+            self._scan = len(self._buf)
+            return None
+        line = bytes(memoryview(self._buf)[:i])
+        del self._buf[:i + 1]
+        self._scan = 0
+        return line
+
+    def drain(self) -> list[str]:
+        """All complete lines currently buffered (decoded, stripped)."""
+        lines = []
+        while True:
+            line = self.pop_line()
+            if line is None:
+                return lines
+            lines.append(line.decode(errors="ignore").strip())
+
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram: 4 buckets per doubling (~19% resolution)
+    from 0.1 ms up to ~100 s. Percentiles report the bucket's upper edge.
+    """
+
+    SUB = 4
+    MIN_MS = 0.1
+    NBUCKETS = 80
+
+    def __init__(self):
+        self.counts = [0] * self.NBUCKETS
+        self.n = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def _index(self, ms: float) -> int:
+        if ms <= self.MIN_MS:
+            return 0
+        i = int(math.ceil(self.SUB * math.log2(ms / self.MIN_MS)))
+        return min(i, self.NBUCKETS - 1)
+
+    def _edge(self, i: int) -> float:
+        return self.MIN_MS * 2 ** (i / self.SUB)
+
+    def record(self, ms: float) -> None:
+        self.counts[self._index(ms)] += 1
+        self.n += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> float | None:
+        """q in [0, 100]; None if nothing recorded."""
+        if not self.n:
+            return None
+        rank = max(1, math.ceil(self.n * q / 100.0))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self._edge(i), self.max_ms)
+        return self.max_ms
+
+
+class LinkStats:
+    """
+    Counters for one LaserClient, keyed by command head ('$LTEMF', '$FIRE', ...):
+    reply latency histogram, commands sent, timeouts (no reply in time) and
+    errors, plus BUSY returns of try_send_cmd/query_many and bytes in/out.
+    Thread-safe; snapshot() is cheap enough to call from the Tk thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.since = time.time()
+            self.hist: dict[str, LatencyHistogram] = {}
+            self.sent: Counter[str] = Counter()
+            self.timeouts: Counter[str] = Counter()
+            self.errors: Counter[str] = Counter()
+            self.busy: Counter[str] = Counter()   # เหตุผล: "stale" (ไม่ได้ส่ง) / "wait" (รอเกินเวลา)
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+    def on_sent(self, heads, nbytes: int) -> None:
+        with self._lock:
+            self.sent.update(heads)
+            self.bytes_out += nbytes
+
+    def on_bytes_in(self, nbytes: int) -> None:
+        with self._lock:
+            self.bytes_in += nbytes
+
+    def on_reply(self, head: str, ms: float) -> None:
+        with self._lock:
+            h = self.hist.get(head)
+            if h is None:
+                h = self.hist[head] = LatencyHistogram()
+            h.record(ms)
+
+    def on_timeout(self, head: str) -> None:
+        with self._lock:
+            self.timeouts[head] += 1
+
+    def on_error(self, heads) -> None:
+        with self._lock:
+            self.errors.update(heads)
+
+    def on_busy(self, reason: str) -> None:
+        with self._lock:
+            self.busy[reason] += 1
+
+    def snapshot(self) -> dict:
+        """Plain-dict copy of all counters (latencies in ms)."""
+        with self._lock:
+            cmds = {}
+            for head in sorted(set(self.sent) | set(self.hist) | set(self.errors)):
+                h = self.hist.get(head)
+                cmds[head] = {
+                    "sent": self.sent[head],
+                    "replies": h.n if h else 0,
+                    "timeouts": self.timeouts[head],
+                    "errors": self.errors[head],
+                    "p50_ms": h.percentile(50) if h else None,
+                    "p95_ms": h.percentile(95) if h else None,
+                    "p99_ms": h.percentile(99) if h else None,
+                    "max_ms": h.max_ms if h else None,
+                    "mean_ms": h.total_ms / h.n if h and h.n else None,
+                }
+            return {
+                "since": self.since,
+                "uptime_s": time.time() - self.since,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "busy": dict(self.busy),
+                "commands": cmds,
+            }
+
+    @staticmethod
+    def format(snap: dict) -> str:
+        """Multi-line summary of a snapshot() for the log panel."""
+        def ms(v):
+            return "-" if v is None else f"{v:.0f}" if v >= 10 else f"{v:.1f}"
+
+        busy = snap["busy"]
+        lines = [
+            f"Link stats ({snap['uptime_s'] / 60:.0f} min): "
+            f"in {snap['bytes_in']} B, out {snap['bytes_out']} B, "
+            f"BUSY {sum(busy.values())} (stale {busy.get('stale', 0)}, wait {busy.get('wait', 0)})"
+        ]
+        for head, c in snap["commands"].items():
+            lines.append(
+                f"  {head:<9} n={c['sent']:<6} p50={ms(c['p50_ms'])} p95={ms(c['p95_ms'])} "
+                f"p99={ms(c['p99_ms'])} max={ms(c['max_ms'])} ms  "
+                f"timeout={c['timeouts']} err={c['errors']}"
+            )
+        return "\n".join(lines)
+
+
+class _LaserProtocol(asyncio.Protocol):
+    """asyncio transport side of one controller connection."""
+
+    def __init__(self, on_lost=None, stats: LinkStats | None = None):
+        self.transport: asyncio.Transport | None = None
+        self.reader = LineReader()
+        self.closed = False
+        self._waiter: asyncio.Future | None = None
+        self._on_lost = on_lost
+        self._stats = stats
+        self.recorder = None               # laser_replay.SessionRecorder (ถ้ากำลังบันทึก)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        if self._stats:
+            self._stats.on_bytes_in(len(data))
+        if self.recorder:
+            self.recorder.rx(data)
+        self.reader.feed(data)
+        self._wake()
+
+    def connection_lost(self, exc):
+        self.closed = True
+        if self.recorder:
+            self.recorder.closed()
+        self._wake()
+        if self._on_lost:
+            self._on_lost(self, exc)
+
+    def _wake(self):
+        w = self._waiter
+        if w is not None and not w.done():
+            w.set_result(None)
+
+    async def readline(self, deadline: float) -> bytes | None:
+        """Next line without its newline, or None if deadline (loop.time()) passes first."""
+        loop = asyncio.get_running_loop()
+        while True:
+            line = self.reader.pop_line()
+            if line is not None:
+                return line
+            if self.closed:
+                raise ConnectionError("Connection closed by controller")
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            self._waiter = loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, remaining)
+            except asyncio.TimeoutError:
+                return None
+            finally:
+                self._waiter = None
+
+
+class _LoopThread:
+    """A private asyncio event loop running on one daemon thread."""
+
+    def __init__(self, name: str = "laser-io"):
+        self.loop = asyncio.new_event_loop()
+        self._th = threading.Thread(target=self._run, name=name, daemon=True)
+        self._th.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self) -> None:
+        if self.loop.is_closed():
+            return
+
+        def _shutdown():
+            for t in asyncio.all_tasks(self.loop):
+                t.cancel()
+            self.loop.call_soon(self.loop.stop)
+
+        self.loop.call_soon_threadsafe(_shutdown)
+        if threading.current_thread() is not self._th:
+            self._th.join(timeout=1.0)
+            if not self.loop.is_running():
+                self.loop.close()
+
+
+@dataclass(frozen=True)
+class CommandTiming:
+    """When a deadline command was due, written to the socket and answered (time.monotonic())."""
+    cmd: str
+    due: float
+    sent: float
+    acked: float | None        # None if no reply within the timeout
+    reply: str
+
+    @property
+    def lateness_ms(self) -> float:
+        return (self.sent - self.due) * 1000.0
+
+    @property
+    def ack_ms(self) -> float | None:
+        return None if self.acked is None else (self.acked - self.sent) * 1000.0
+
+
+class _SharedIO:
+    """
+    One event loop thread for every LaserClient in the process (asyncio's
+    selector loop = one epoll set holding all controller sockets and timers).
+    Reference counted: the thread starts with the first client and stops
+    when the last one closes.
+    """
+
+    _lock = threading.Lock()
+    _io: _LoopThread | None = None
+    _refs = 0
+
+    @classmethod
+    def acquire(cls) -> _LoopThread:
+        with cls._lock:
+            if cls._io is None or cls._io.loop.is_closed():
+                cls._io = _LoopThread(name="laser-io")
+                cls._refs = 0
+            cls._refs += 1
+            return cls._io
+
+    @classmethod
+    def release(cls, io: _LoopThread) -> None:
+        with cls._lock:
+            if io is not cls._io:
+                return
+            cls._refs -= 1
+            if cls._refs > 0:
+                return
+            cls._io = None
+        io.stop()
+
+
+def acquire_io() -> _LoopThread:
+    return _SharedIO.acquire()
+
+
+def release_io(io: _LoopThread) -> None:
+    _SharedIO.release(io)
+
+
+class _Job:
+    __slots__ = ("cmds", "many", "priority", "deadline", "timeout", "future", "marks")
+
+    def __init__(self, cmds: tuple[str, ...], many: bool, priority: int,
+                 deadline: float | None, timeout: float):
+        self.cmds = cmds
+        self.many = many
+        self.priority = priority
+        self.deadline = deadline
+        self.timeout = timeout
+        self.future: Future = Future()
+        self.marks: dict | None = None    # {"sent": t, "acked": t} ถ้าต้องการวัดเวลา
+
+
+class CommandDispatcher:
+    """
+    Priority queue served by one coroutine on the client's event loop.
+    Jobs are served by (priority, arrival order); a job whose deadline has
+    passed before it reaches the head of the queue is dropped with StaleCommand.
+    submit_at() arms a job for an exact time: until then the link is kept free
+    of any non-safety exchange that could still be in flight at that moment.
+    submit()/submit_at()/close() are thread-safe; everything else runs on the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, exchange):
+        self._loop = loop
+        self._timers: dict = {}            # call_at handle → job ของ submit_at ที่ยังไม่ถึงเวลา
+        self._exchange = exchange          # async exchange(cmds, timeout, marks) -> list[str]
+        self._heap: list[tuple[int, int, _Job]] = []
+        self._holds: list[float] = []      # loop.time() ของงาน submit_at ที่ยังไม่ถึงเวลา
+        self._seq = itertools.count()
+        self._closed = False
+        self._wakeup: asyncio.Event | None = None
+        self._task = asyncio.run_coroutine_threadsafe(self._run(), loop)
+
+    def submit(self, job: _Job) -> Future:
+        if self._closed:
+            raise RuntimeError("Not connected")
+        self._loop.call_soon_threadsafe(self._push, job)
+        return job.future
+
+    def submit_at(self, job: _Job, at: float) -> Future:
+        """Push job into the queue at time.monotonic() == at."""
+        if self._closed:
+            raise RuntimeError("Not connected")
+        self._loop.call_soon_threadsafe(self._arm, job, at)
+        return job.future
+
+    def close(self) -> None:
+        self._closed = True
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fail_pending)
+            self._task.cancel()
+
+    def _arm(self, job: _Job, at: float) -> None:
+        when = self._loop.time() + (at - time.monotonic())
+        heapq.heappush(self._holds, when)
+
+        def release():
+            self._timers.pop(handle, None)
+            try:
+                self._holds.remove(when)
+                heapq.heapify(self._holds)
+            except ValueError:
+                pass
+            self._push(job)
+
+        handle = self._loop.call_at(when, release)
+        self._timers[handle] = job
+
+    def _push(self, job: _Job) -> None:
+        if self._closed:
+            self._fail(job)
+            return
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    def _fail(job: _Job) -> None:
+        if job.future.set_running_or_notify_cancel():
+            job.future.set_exception(RuntimeError("Not connected"))
+
+    def _fail_pending(self) -> None:
+        armed = list(self._timers.items())
+        self._timers.clear()
+        self._holds.clear()
+        for h, _ in armed:
+            h.cancel()
+        pending = [j for _, j in armed] + [j for _, _, j in self._heap]
+        self._heap.clear()
+        for j in pending:
+            self._fail(j)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        self._wakeup = asyncio.Event()
+        while True:
+            while not self._heap and not self._closed:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if self._closed:
+                return
+            entry = heapq.heappop(self._heap)
+            job = entry[2]
+            if self._holds and job.priority > PRIO_SAFETY:
+                # มีคำสั่งตั้งเวลาไว้ก่อนที่งานนี้จะเสร็จ → รอให้คำสั่งนั้นออกไปก่อน
+                wait = self._holds[0] - self._loop.time()
+                if wait < job.timeout:
+                    heapq.heappush(self._heap, entry)
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), max(wait, 0.0) + 0.001)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+            if not job.future.set_running_or_notify_cancel():
+                continue  # ผู้เรียกเลิกรอไปแล้ว
+            if job.deadline is not None and time.monotonic() > job.deadline:
+                job.future.set_exception(StaleCommand("; ".join(job.cmds)))
+                continue
+            try:
+                replies = await self._exchange(job.cmds, job.timeout, job.marks)
+                job.future.set_result(replies if job.many else replies[0])
+            except asyncio.CancelledError:
+                job.future.set_exception(RuntimeError("Not connected"))
+                raise
+            except Exception as e:
+                job.future.set_exception(e)
+
 
 class LaserClient:
-    """Simple TCP client for the laser controller (telnet-like)."""
+    """
+    TCP client for the laser controller (telnet-like).
+    The socket is owned by an asyncio event loop on a background thread,
+    by default the one loop shared by every client in the process (shared_io),
+    so N controllers cost one thread and one epoll set. Sends and receives are
+    non-blocking and every request carries its own deadline; no per-call
+    socket timeouts. Every public method is safe to call from Tk or worker
+    threads. Do not call the blocking helpers (send_cmd/try_send_cmd/query_many)
+    from a Future callback or a listener, since those run on the I/O thread.
+
+    The link is supervised: TCP keepalive is on, and if the connection drops
+    (or max_silent exchanges in a row get no reply at all) it is re-opened with
+    exponential backoff and "$LOGIN <user>" is replayed. Commands submitted
+    while the link is down fail fast with RuntimeError; nothing is queued for
+    later, so a stale $FIRE can never go out after a reconnect.
+    """
 
-    def __init__(self, host: str, port: int, timeout: float = 3.0):
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        timeout: float = 3.0,
+        user: str | None = None,
+        auto_reconnect: bool = True,
+        backoff_initial: float = 0.5,
+        backoff_max: float = 30.0,
+        max_silent: int = 3,
+        shared_io: bool = True,
+    ):
         self.host = host
         self.port = port
         self.timeout = timeout
-        self.sock: socket.socket | None = None
+        self.user = user
+        self.auto_reconnect = auto_reconnect
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_silent = max_silent
+        self.shared_io = shared_io
+        self.state = STATE_CLOSED
+        self.login_reply = ""
+        self.reconnects = 0
+        self._io: _LoopThread | None = None
+        self._proto: _LaserProtocol | None = None
+        self._dispatcher: CommandDispatcher | None = None
+        self._reconnect_task: asyncio.Task | None = None
+        self._late: Counter[str] = Counter()  # คำตอบที่ timeout ไปแล้ว (ตาม command head)
+        self._silent = 0                      # exchange ติดกันที่ไม่ได้คำตอบเลย
+        self._closing = False
+        self._up = threading.Event()
+        self._listeners: list = []
+        self.stats = LinkStats()
+        self.status = StatusTracker()         # ทุกคำตอบ $STATUS ถูกป้อนเข้ามาที่นี่
+        self.recorder = None                  # laser_replay.SessionRecorder: บันทึก byte ที่รับ/ส่งทั้งหมด
         self.lock = threading.Lock()
 
+    @property
+    def connected(self) -> bool:
+        p = self._proto
+        return p is not None and not p.closed
+
+    # ---------- connection state ----------
+    def add_state_listener(self, fn) -> None:
+        """fn(state, detail) on every link state change (called on the I/O thread)."""
+        self._listeners.append(fn)
+
+    def wait_connected(self, timeout: float | None = None) -> bool:
+        """Block until the link is up (True) or timeout passes (False)."""
+        return self._up.wait(timeout)
+
+    def _set_state(self, state: str, detail: str = "") -> None:
+        self.state = state
+        if state == STATE_CONNECTED:
+            self._up.set()
+        else:
+            self._up.clear()
+        for fn in list(self._listeners):
+            try:
+                fn(state, detail)
+            except Exception:
+                pass
+
     def connect(self) -> None:
-        self.close()
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(self.timeout)
-        s.connect((self.host, self.port))
-        self.sock = s
+        self._shutdown()
+        self._closing = False
+        io = acquire_io() if self.shared_io else _LoopThread(name=f"laser-io {self.host}:{self.port}")
+        try:
+            proto, reply = io.run(self._open()).result()
+        except BaseException:
+            self._release(io)
+            raise
+        with self.lock:
+            self._io = io
+            self._proto = proto
+            self._late.clear()
+            self._silent = 0
+            self.login_reply = reply
+            self._dispatcher = CommandDispatcher(io.loop, self._exchange)
+        self._set_state(STATE_CONNECTED, f"{self.host}:{self.port}")
+
+    async def _open(self) -> tuple[_LaserProtocol, str]:
+        loop = asyncio.get_running_loop()
+        transport, proto = await asyncio.wait_for(
+            loop.create_connection(lambda: _LaserProtocol(self._on_lost, self.stats), self.host, self.port),
+            self.timeout,
+        )
+        _enable_keepalive(transport.get_extra_info("socket"))
+        if self.recorder:
+            proto.recorder = self.recorder
+            self.recorder.opened(f"{self.host}:{self.port}")
+        reply = ""
+        if self.user:
+            try:
+                reply = (await self._exchange_on(proto, (f"$LOGIN {self.user}",), self.timeout))[0]
+            except BaseException:
+                transport.close()
+                raise
+        return proto, reply
+
+    def _on_lost(self, proto: _LaserProtocol, exc) -> None:
+        # เรียกบน I/O thread เมื่อ socket หลุด
+        if proto is not self._proto or self._closing:
+            return
+        self._proto = None
+        if not self.auto_reconnect:
+            self._set_state(STATE_CLOSED, f"link lost: {exc or 'closed by controller'}")
+            return
+        self._set_state(STATE_RECONNECTING, f"link lost: {exc or 'closed by controller'}")
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self) -> None:
+        delay = self.backoff_initial
+        attempt = 0
+        while not self._closing:
+            attempt += 1
+            try:
+                proto, reply = await self._open()
+            except Exception as e:
+                wait = delay * random.uniform(0.8, 1.2)
+                self._set_state(STATE_RECONNECTING, f"attempt {attempt} failed ({e}); retry in {wait:.1f}s")
+                await asyncio.sleep(wait)
+                delay = min(delay * 2, self.backoff_max)
+                continue
+            if self._closing:
+                proto.transport.close()
+                return
+            self._reconnect_task = None
+            self._proto = proto
+            self._late.clear()
+            self._silent = 0
+            self.login_reply = reply
+            self.reconnects += 1
+            self._set_state(STATE_CONNECTED, f"reconnected after {attempt} attempt(s)")
+            return
 
     def close(self) -> None:
+        self._shutdown()
+        rec, self.recorder = self.recorder, None
+        if rec:
+            rec.close()
+
+    def _shutdown(self) -> None:
+        self._closing = True
         with self.lock:
-            if self.sock:
-                try:
-                    self.sock.close()
-                except Exception:
-                    pass
-                self.sock = None
+            disp, self._dispatcher = self._dispatcher, None
+            proto, self._proto = self._proto, None
+            io, self._io = self._io, None
+        if disp:
+            disp.close()
+        if io:
+            task, self._reconnect_task = self._reconnect_task, None
+            if not io.loop.is_closed():
+                if task:
+                    io.loop.call_soon_threadsafe(task.cancel)
+                if proto and proto.transport:
+                    io.loop.call_soon_threadsafe(proto.transport.close)
+            self._release(io)
+        if self.state != STATE_CLOSED:
+            self._set_state(STATE_CLOSED, "closed")
+
+    def _release(self, io: _LoopThread) -> None:
+        if self.shared_io:
+            release_io(io)
+        else:
+            io.stop()
+
+    def submit(
+        self,
+        cmd: str,
+        priority: int | None = None,
+        deadline: float | None = None,
+        timeout: float | None = None,
+    ) -> Future:
+        """
+        Queue a command and return a Future resolving to its one-line response.
+        deadline: absolute time.monotonic(); if not sent by then -> StaleCommand.
+        """
+        disp = self._dispatcher
+        if not disp:
+            raise RuntimeError("Not connected")
+        prio = command_priority(cmd) if priority is None else priority
+        to = self.timeout if timeout is None else timeout
+        return disp.submit(_Job((cmd,), False, prio, deadline, to))
+
+    def submit_many(
+        self,
+        cmds,
+        priority: int | None = None,
+        deadline: float | None = None,
+        timeout: float | None = None,
+    ) -> Future:
+        """
+        Pipeline several commands in one write; the Future resolves to the
+        replies in the same order ("" for any reply missing at timeout).
+        """
+        disp = self._dispatcher
+        if not disp:
+            raise RuntimeError("Not connected")
+        cmds = tuple(cmds)
+        if not cmds:
+            raise ValueError("no commands")
+        prio = min(command_priority(c) for c in cmds) if priority is None else priority
+        to = self.timeout if timeout is None else timeout
+        return disp.submit(_Job(cmds, True, prio, deadline, to))
+
+    def send_at(self, cmd: str, at: float, timeout: float | None = None) -> Future:
+        """
+        Send cmd at the absolute time.monotonic() deadline `at` (right away if
+        already past). The Future resolves to a CommandTiming with the
+        measured send time, ack time and lateness. Cancelling the Future before
+        `at` withdraws the command (it is never sent).
+        """
+        disp = self._dispatcher
+        if not disp:
+            raise RuntimeError("Not connected")
+        to = self.timeout if timeout is None else timeout
+        job = _Job((cmd,), False, PRIO_SAFETY, None, to)
+        job.marks = {}
+        out: Future = Future()
+
+        def done(f: Future):
+            if out.done():
+                return  # ผู้เรียกยกเลิกไปแล้ว
+            if f.cancelled():
+                out.cancel()
+            elif f.exception() is not None:
+                out.set_exception(f.exception())
+            else:
+                m = job.marks
+                out.set_result(CommandTiming(cmd, at, m.get("sent", at), m.get("acked"), f.result()))
+
+        job.future.add_done_callback(done)
+        out.add_done_callback(lambda o: o.cancelled() and job.future.cancel())
+        disp.submit_at(job, at)
+        return out
 
     def send_cmd(self, cmd: str) -> str:
         """Send a command like '$FIRE' and return one-line response (ending with \\n)."""
-        with self.lock:
-            if not self.sock:
-                raise RuntimeError("Not connected")
-            data = (cmd.strip() + "\n").encode()
-            self.sock.sendall(data)
-            self.sock.settimeout(self.timeout)
-            chunks = []
-            try:
-                while True:
-                    b = self.sock.recv(1024)
-                    if not b:
-                        break
-                    chunks.append(b)
-                    if b.endswith(b"\n"):
-                        break
-            except socket.timeout:
+        return self.submit(cmd).result()
+
+    def try_send_cmd(self, cmd: str, call_timeout: float | None = None) -> str | None:
+        """
+        Telemetry-priority query with a short budget.
+        Returns None (BUSY) if it could not be sent within call_timeout.
+        """
+        to = self.timeout if call_timeout is None else call_timeout
+        fut = self.submit(cmd, priority=PRIO_TELEMETRY,
+                          deadline=time.monotonic() + to, timeout=to)
+        try:
+            return fut.result(timeout=2 * to + 0.1)
+        except StaleCommand:
+            self.stats.on_busy("stale")
+            return None
+        except FutureTimeout:
+            fut.cancel()
+            self.stats.on_busy("wait")
+            return None
+
+    def query_many(self, cmds, call_timeout: float | None = None) -> list[str] | None:
+        """Telemetry-priority pipelined queries; None (BUSY) like try_send_cmd."""
+        to = self.timeout if call_timeout is None else call_timeout
+        fut = self.submit_many(cmds, priority=PRIO_TELEMETRY,
+                               deadline=time.monotonic() + to, timeout=to)
+        try:
+            return fut.result(timeout=2 * to + 0.1)
+        except StaleCommand:
+            self.stats.on_busy("stale")
+            return None
+        except FutureTimeout:
+            fut.cancel()
+            self.stats.on_busy("wait")
+            return None
+
+    def stats_snapshot(self) -> dict:
+        """Latency percentiles and counters since the client was created (see LinkStats)."""
+        return self.stats.snapshot()
+
+    def get_status(self):
+        # ใช้ non-blocking + timeout สั้น
+        # กลับ None เพื่อให้ผู้เรียกตัดสินใจว่าจะคงค่าเดิมไว้
+        st = self.get_status_record()
+        return st.label if st else None
+
+    def get_status_record(self, call_timeout: float = 0.4) -> LaserStatus | None:
+        """Query $STATUS and return the decoded record (None if BUSY/unreadable)."""
+        return decode_status(self.try_send_cmd("$STATUS ?", call_timeout=call_timeout),
+                             time.monotonic())
+
+    def confirm_mode_async(self, mode: str, timeout: float = 1.0, interval: float = 0.05) -> Future:
+        """
+        Poll $STATUS on the I/O loop until the controller reports mode (e.g.
+        "FIRE") or timeout. Returns at once with a Future resolving to the first
+        matching LaserStatus (its ts tells when), or None on timeout / link
+        loss. Use add_done_callback; it is called on the I/O thread.
+        """
+        io = self._io
+        if io is None:
+            raise RuntimeError("Not connected")
+        return io.run(self._confirm_mode(mode, timeout, interval))
+
+    async def _confirm_mode(self, mode: str, timeout: float, interval: float) -> LaserStatus | None:
+        t0 = time.monotonic()
+        end = t0 + timeout
+        while True:
+            st = self.status.last
+            if st is not None and st.ts >= t0 and st.mode == mode:
+                return st
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return None
+            to = min(0.4, max(remaining, 0.05))
+            try:
+                # คำตอบ $STATUS ถูก feed เข้า self.status ใน _exchange_on
+                await asyncio.wrap_future(self.submit("$STATUS ?", priority=PRIO_TELEMETRY,
+                                                      deadline=time.monotonic() + to, timeout=to))
+            except StaleCommand:
+                self.stats.on_busy("stale")
+            except RuntimeError:
+                return None  # ลิงก์หลุด
+            st = self.status.last
+            if st is not None and st.ts >= t0 and st.mode == mode:
+                return st
+            await asyncio.sleep(max(0.0, min(interval, end - time.monotonic())))
+
+    async def _exchange(self, cmds: tuple[str, ...], timeout: float, marks: dict | None = None) -> list[str]:
+        # ทำงานบน event loop ของ client เท่านั้น
+        proto = self._proto
+        if proto is None or proto.closed or proto.transport is None:
+            self.stats.on_error(reply_head(c) for c in cmds)
+            raise RuntimeError("Not connected" if self.state != STATE_RECONNECTING
+                               else "Link down (reconnecting)")
+        try:
+            replies = await self._exchange_on(proto, cmds, timeout, marks)
+        except Exception:
+            self.stats.on_error(reply_head(c) for c in cmds)
+            raise
+        if any(replies):
+            self._silent = 0
+        else:
+            self._silent += 1
+            if self.max_silent and self._silent >= self.max_silent:
+                # socket ยังเปิดแต่ controller ไม่ตอบ → ตัดทิ้งให้ reconnect
+                proto.transport.abort()
+        return replies
+
+    async def _exchange_on(self, proto: _LaserProtocol, cmds: tuple[str, ...], timeout: float,
+                           marks: dict | None = None) -> list[str]:
+        # ทุกบรรทัดที่มาถึงก่อนส่งคำสั่ง ไม่ใช่คำตอบของคำสั่งนี้แน่นอน
+        for line in proto.reader.drain():
+            head = reply_head(line)
+            if self._late[head] > 0:
+                self._late[head] -= 1
+
+        data = "".join(c.strip() + "\n" for c in cmds).encode()
+        loop = asyncio.get_running_loop()
+        wants = [reply_head(c) for c in cmds]
+        t0 = loop.time()
+        proto.transport.write(data)
+        if proto.recorder:
+            proto.recorder.tx(data)
+        if marks is not None:
+            marks["sent"] = time.monotonic()
+        self.stats.on_sent(wants, len(data))
+        deadline = t0 + timeout
+        replies: list[str] = []
+        while len(replies) < len(cmds):
+            raw = await proto.readline(deadline)
+            if raw is None:
+                break
+            line = raw.decode(errors="ignore").strip()
+            head = reply_head(line)
+            i = len(replies)
+            if head and head != wants[i]:
+                if head in wants[i + 1:]:
+                    # คำตอบของคำสั่งก่อนหน้าใน batch หายไป → เว้นว่างไว้แล้วจับคู่ต่อ
+                    j = wants.index(head, i + 1)
+                    for k in range(i, j):
+                        self._late[wants[k]] += 1
+                    replies.extend([""] * (j - i))
+                elif self._late[head] > 0:
+                    # คำตอบที่มาช้าของคำสั่งก่อนหน้า → ทิ้ง
+                    self._late[head] -= 1
+                    continue
+            self.stats.on_reply(wants[len(replies)], (loop.time() - t0) * 1000.0)
+            if marks is not None and not replies:
+                marks["acked"] = time.monotonic()
+            if head == "$STATUS":
+                st = decode_status(line, time.monotonic())
+                if st:
+                    self.status.feed(st)
+            replies.append(line)
+        for want, r in zip(wants, replies):
+            if not r:
+                self.stats.on_timeout(want)
+        # คำตอบที่ยังไม่มา จะถูกทิ้งเมื่อมาถึงภายหลัง
+        for want in wants[len(replies):]:
+            self._late[want] += 1
+            self.stats.on_timeout(want)
+        return replies + [""] * (len(cmds) - len(replies))
+
+
+class _Pending:
+    __slots__ = ("cmd", "callbacks")
+
+    def __init__(self, cmd: str, callback):
+        self.cmd = cmd
+        self.callbacks = [callback] if callback else []
+
+
+class CommandWorker(threading.Thread):
+    """
+    One ordered sender for fire-and-forget commands (replaces a thread per command).
+    Commands go out strictly in submit() order through client_getter().send_cmd().
+    A $STANDBY/$STOP identical to the one already waiting at the tail of the
+    queue is collapsed into it (its callback is still called). The queue is
+    bounded: when full, a safety command evicts the oldest queued non-safety
+    command, anything else is rejected.
+    Callbacks are called as cb(cmd, resp, err) on the worker thread.
+    """
+
+    COLLAPSE_CMDS = ("$STANDBY", "$STOP")
+
+    def __init__(self, client_getter, maxsize: int = 32, name: str = "laser-cmd"):
+        super().__init__(name=name, daemon=True)
+        self._client_getter = client_getter
+        self.maxsize = maxsize
+        self._q: deque[_Pending] = deque()
+        self._cv = threading.Condition()
+        self._busy = False
+        self._stopped = False
+        self.collapsed = 0
+        self.rejected = 0
+
+    def submit(self, cmd: str, callback=None) -> bool:
+        """Queue cmd; False if it was rejected (queue full or worker stopped)."""
+        cmd = cmd.strip()
+        head = reply_head(cmd)
+        item = _Pending(cmd, callback)
+        dropped: tuple[_Pending, str] | None = None
+        with self._cv:
+            if self._stopped:
+                dropped = (item, "Command worker stopped")
+            elif head in self.COLLAPSE_CMDS and self._q and self._q[-1].cmd == cmd:
+                self._q[-1].callbacks.extend(item.callbacks)
+                self.collapsed += 1
+            elif len(self._q) >= self.maxsize and head not in SAFETY_CMDS:
+                self.rejected += 1
+                dropped = (item, "Command queue full")
+            else:
+                if len(self._q) >= self.maxsize:
+                    # คำสั่ง safety ต้องเข้าคิวเสมอ → เบียดคำสั่งธรรมดาที่เก่าที่สุดออก
+                    victim = next((q for q in self._q if reply_head(q.cmd) not in SAFETY_CMDS), None)
+                    if victim is not None:
+                        self._q.remove(victim)
+                        self.rejected += 1
+                        dropped = (victim, "Dropped (command queue full)")
+                self._q.append(item)
+                self._cv.notify()
+        if dropped:
+            self._finish(dropped[0], "", RuntimeError(dropped[1]))
+        return dropped is None or dropped[0] is not item
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until everything queued so far has been sent (True) or timeout."""
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cv:
+            while self._q or self._busy:
+                remaining = None if end is None else end - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cv.wait(remaining)
+            return True
+
+    def stop(self) -> None:
+        """Stop after the command in flight; fail whatever is still queued."""
+        with self._cv:
+            self._stopped = True
+            left = list(self._q)
+            self._q.clear()
+            self._cv.notify_all()
+        for p in left:
+            self._finish(p, "", RuntimeError("Command worker stopped"))
+
+    @staticmethod
+    def _finish(p: _Pending, resp: str, err: Exception | None) -> None:
+        for cb in p.callbacks:
+            try:
+                cb(p.cmd, resp, err)
+            except Exception:
                 pass
-            return b"".join(chunks).decode(errors="ignore").strip()
+
+    def run(self) -> None:
+        while True:
+            with self._cv:
+                while not self._q and not self._stopped:
+                    self._cv.wait()
+                if self._stopped:
+                    return
+                p = self._q.popleft()
+                self._busy = True
+            resp, err = "", None
+            try:
+                client = self._client_getter()
+                if client is None:
+                    raise RuntimeError("Not connected")
+                resp = client.send_cmd(p.cmd)
+            except Exception as e:
+                err = e
+            self._finish(p, resp, err)
+            with self._cv:
+                self._busy = False
+                self._cv.notify_all()
@@ -0,0 +1,199 @@
+# laser_pool.py
+"""
+Several laser controllers driven from one process.
+
+Each device (keyed by a short id such as "laser1") gets its own LaserClient
+and its own CommandWorker. All sockets and timers run on the one shared I/O
+event loop (laser_client.acquire_io), so a slow or unreachable controller
+never blocks the others. Telemetry uses one telemetry.TelemetrySampler per
+device (same adaptive rates, grid slots and missed-slot counting as the
+primary laser); consumers subscribe to device.sampler.
+
+    pool = LaserPool()
+    pool.add(DeviceConfig("laser1", "192.168.3.10", 2323, "VR70AB07"))
+    pool.add(DeviceConfig("laser2", "192.168.3.11", 2323, "VR70AB07"))
+    pool.connect_all()                      # parallel, returns {id: error or None}
+    samplers = pool.start_sampling(policy=SamplingPolicy(), state=lambda dev_id: STATE_IDLE)
+    sub = samplers["laser2"].subscribe("csv", maxlen=256)
+    pool.device("laser2").send("$FIRE")
+"""
+from __future__ import annotations
+import threading
+import time
+from dataclasses import dataclass
+
+from laser_client import CommandWorker, LaserClient, SAMPLE_CMDS
+from telemetry import SamplingPolicy, TelemetrySampler
+
+DEFAULT_DEVICE = "laser1"
+
+
+@dataclass
+class DeviceConfig:
+    device_id: str
+    host: str
+    port: int = 2323
+    user: str = ""
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "DeviceConfig":
+        return cls(str(d["id"]), str(d["host"]), int(d.get("port", 2323)), str(d.get("user", "")))
+
+    def to_dict(self) -> dict:
+        return {"id": self.device_id, "host": self.host, "port": self.port, "user": self.user}
+
+
+class LaserDevice:
+    """One controller: client + ordered command worker + telemetry sampler."""
+
+    def __init__(self, cfg: DeviceConfig):
+        self.cfg = cfg
+        self.client: LaserClient | None = None
+        self.worker = CommandWorker(lambda: self.client, name=f"laser-cmd {cfg.device_id}")
+        self.worker.start()
+        self.sampler: TelemetrySampler | None = None
+
+    @property
+    def device_id(self) -> str:
+        return self.cfg.device_id
+
+    @property
+    def connected(self) -> bool:
+        return self.client is not None and self.client.connected
+
+    def connect(self, setup=None) -> None:
+        """(Re)open the link; setup(client) runs before connecting, e.g. to add listeners."""
+        self.close_client()
+        c = LaserClient(self.cfg.host, self.cfg.port, user=self.cfg.user or None)
+        if setup:
+            setup(c)
+        c.connect()
+        self.client = c
+
+    def close_client(self) -> None:
+        c, self.client = self.client, None
+        if c:
+            c.close()
+
+    def send(self, cmd: str, callback=None) -> bool:
+        """Queue a command on this device's worker (see CommandWorker.submit)."""
+        return self.worker.submit(cmd, callback)
+
+    def read_sample(self) -> list[str] | None:
+        """Pipelined SAMPLE_CMDS replies for TelemetrySampler; None if BUSY, not connected or on error."""
+        c = self.client
+        if c is None or not c.connected:
+            return None
+        try:
+            return c.query_many(SAMPLE_CMDS, call_timeout=0.6)
+        except Exception:
+            return None  # ลิงก์หลุด/กำลัง reconnect → slot นี้นับเป็น missed
+
+    def start_sampling(self, policy: SamplingPolicy | None = None, state=None, tz=None) -> TelemetrySampler:
+        """Start (or restart) this device's sampler; subscribers attach to the returned sampler."""
+        self.stop_sampling()
+        self.sampler = TelemetrySampler(self.read_sample, policy, state, tz,
+                                        name=f"telemetry {self.device_id}")
+        self.sampler.start()
+        return self.sampler
+
+    def stop_sampling(self) -> None:
+        """Stop the sampler and close its subscriptions (wakes their consumers)."""
+        sampler, self.sampler = self.sampler, None
+        if sampler:
+            sampler.stop()
+            sampler.join(timeout=1.0)
+
+    def close(self) -> None:
+        self.stop_sampling()
+        self.worker.flush(timeout=2.0)
+        self.worker.stop()
+        self.close_client()
+
+
+class LaserPool:
+    """Devices keyed by id; all methods are safe to call from any thread."""
+
+    def __init__(self):
+        self._devices: dict[str, LaserDevice] = {}
+        self._lock = threading.Lock()
+
+    def ids(self) -> list[str]:
+        with self._lock:
+            return list(self._devices)
+
+    def device(self, device_id: str) -> LaserDevice | None:
+        with self._lock:
+            return self._devices.get(device_id)
+
+    def client(self, device_id: str) -> LaserClient | None:
+        dev = self.device(device_id)
+        return dev.client if dev else None
+
+    def add(self, cfg: DeviceConfig) -> LaserDevice:
+        """Add (or replace, if the id exists) a device; does not connect."""
+        dev = LaserDevice(cfg)
+        with self._lock:
+            old = self._devices.get(cfg.device_id)
+            self._devices[cfg.device_id] = dev
+        if old:
+            old.close()
+        return dev
+
+    def configs(self) -> list[DeviceConfig]:
+        with self._lock:
+            return [d.cfg for d in self._devices.values()]
+
+    def connect_all(self, timeout: float = 10.0, ids=None, setup=None) -> dict[str, Exception | None]:
+        """
+        Connect devices (all, or just ids) in parallel; {id: None on success,
+        else the error}. setup(device_id, client) runs for each device before
+        it connects (listeners, status subscriptions, recorder).
+        """
+        result: dict[str, Exception | None] = {}
+        threads = []
+        with self._lock:
+            devs = [d for i, d in self._devices.items() if ids is None or i in ids]
+        for dev in devs:
+            def run(d=dev):
+                try:
+                    d.connect(setup and (lambda c: setup(d.device_id, c)))
+                    result[d.device_id] = None
+                except Exception as e:
+                    result[d.device_id] = e
+            th = threading.Thread(target=run, name=f"laser-connect {dev.device_id}", daemon=True)
+            th.start()
+            threads.append((dev.device_id, th))
+        end = time.monotonic() + timeout
+        for dev_id, th in threads:
+            th.join(max(0.0, end - time.monotonic()))
+            result.setdefault(dev_id, TimeoutError("connect timed out"))
+        return result
+
+    def start_sampling(self, ids=None, policy: SamplingPolicy | None = None, state=None,
+                       tz=None) -> dict[str, TelemetrySampler]:
+        """
+        One TelemetrySampler per device (all, or just ids). Each gets its own
+        copy of policy; state(device_id) -> STATE_* picks its rate.
+        """
+        out = {}
+        for dev_id in (self.ids() if ids is None else ids):
+            dev = self.device(dev_id)
+            if dev is None:
+                continue
+            pol = SamplingPolicy(**policy.to_dict()) if policy else None
+            st = (lambda d=dev_id: state(d)) if state else None
+            out[dev_id] = dev.start_sampling(pol, st, tz)
+        return out
+
+    def stop_sampling(self) -> None:
+        for dev_id in self.ids():
+            dev = self.device(dev_id)
+            if dev:
+                dev.stop_sampling()
+
+    def close_all(self) -> None:
+        with self._lock:
+            devs = list(self._devices.values())
+        for d in devs:
+            d.close()
@@ -0,0 +1,271 @@
+# laser_replay.py
+"""
+Record a controller TCP session from LaserClient and replay it later.
+
+Record (bytes exactly as they crossed the socket, partial chunks included):
+
+    from laser_replay import SessionRecorder
+    client.recorder = SessionRecorder("logs/data/session.lsr")
+    ...
+    client.recorder.close()
+
+Replay through a loopback socket, at recorded speed or faster, and point a
+LaserClient (or the app) at it:
+
+    python laser_replay.py serve logs/data/session.lsr --speed 10
+    python laser_replay.py dump  logs/data/session.lsr
+    python laser_replay.py bench logs/data/session.lsr      # framing throughput
+
+File format: b"LSR1" + float64 wall-clock start, then records of
+struct "<BQI" (kind, microseconds since start, payload length) + payload.
+"""
+from __future__ import annotations
+import argparse
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Iterator, NamedTuple
+
+from laser_client import LineReader
+
+MAGIC = b"LSR1"
+REC_TX = 0      # client → controller
+REC_RX = 1      # controller → client (one recv chunk)
+REC_OPEN = 2    # payload = "host:port"
+REC_CLOSE = 3
+
+_HDR = struct.Struct("<BQI")
+_KIND_NAMES = {REC_TX: "TX", REC_RX: "RX", REC_OPEN: "OPEN", REC_CLOSE: "CLOSE"}
+
+
+class Record(NamedTuple):
+    kind: int
+    t: float          # seconds since the start of the capture
+    data: bytes
+
+
+class SessionRecorder:
+    """Append-only capture file; thread-safe, called from the client's I/O thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "wb")
+        self._t0 = time.monotonic()
+        self._f.write(MAGIC + struct.pack("<d", time.time()))
+        self._lock = threading.Lock()
+
+    def _write(self, kind: int, data: bytes) -> None:
+        us = int((time.monotonic() - self._t0) * 1e6)
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.write(_HDR.pack(kind, us, len(data)))
+            self._f.write(data)
+
+    def tx(self, data: bytes) -> None:
+        self._write(REC_TX, bytes(data))
+
+    def rx(self, data: bytes) -> None:
+        self._write(REC_RX, bytes(data))
+
+    def opened(self, peer: str) -> None:
+        self._write(REC_OPEN, peer.encode())
+
+    def closed(self) -> None:
+        self._write(REC_CLOSE, b"")
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+
+def read_session(path: str) -> Iterator[Record]:
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC) + 8)
+        if head[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not a session capture")
+        while True:
+            h = f.read(_HDR.size)
+            if len(h) < _HDR.size:
+                return
+            kind, us, n = _HDR.unpack(h)
+            data = f.read(n)
+            if len(data) < n:
+                return  # capture ถูกตัดกลางคัน
+            yield Record(kind, us / 1e6, data)
+
+
+def iter_rx_lines(path: str) -> Iterator[str]:
+    """Controller reply lines of a capture, re-framed chunk by chunk through LineReader."""
+    reader = LineReader()
+    for rec in read_session(path):
+        if rec.kind == REC_RX:
+            reader.feed(rec.data)
+            yield from reader.drain()
+
+
+def split_connections(records) -> list[list[Record]]:
+    """Group records into one list per TCP connection (OPEN .. CLOSE)."""
+    conns: list[list[Record]] = []
+    cur: list[Record] | None = None
+    for rec in records:
+        if rec.kind == REC_OPEN:
+            cur = []
+            conns.append(cur)
+        elif cur is None:
+            cur = []
+            conns.append(cur)
+        if rec.kind != REC_OPEN:
+            cur.append(rec)
+        if rec.kind == REC_CLOSE:
+            cur = None
+    return [c for c in conns if c]
+
+
+class _ReplayHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        srv: ReplayServer = self.server.replay  # type: ignore[attr-defined]
+        script = srv._next_script()
+        if script is None:
+            return
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        pending = b""
+        ref_rec, ref_now = 0.0, time.monotonic()
+        try:
+            for rec in script:
+                if rec.kind == REC_TX:
+                    # รอให้ client ส่งจำนวนบรรทัดเท่าที่บันทึกไว้ แล้วค่อยเล่นคำตอบถัดไป
+                    want = rec.data.count(b"\n")
+                    while pending.count(b"\n") < want:
+                        chunk = sock.recv(4096)
+                        if not chunk:
+                            return
+                        pending += chunk
+                    cut = 0
+                    for _ in range(want):
+                        cut = pending.index(b"\n", cut) + 1
+                    got, pending = pending[:cut], pending[cut:]
+                    srv._count(got == rec.data)
+                    ref_rec, ref_now = rec.t, time.monotonic()
+                elif rec.kind == REC_RX:
+                    if srv.speed > 0:
+                        delay = ref_now + (rec.t - ref_rec) / srv.speed - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    sock.sendall(rec.data)
+                elif rec.kind == REC_CLOSE:
+                    return
+        except OSError:
+            return
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class ReplayServer:
+    """
+    Plays a capture back to whoever connects: each recorded connection is
+    replayed to the next client connection. Replies are released only after
+    the client has sent the request lines that preceded them in the capture,
+    with the recorded gap divided by speed (speed=0: no delay).
+    """
+
+    def __init__(self, path: str, host: str = "127.0.0.1", port: int = 0,
+                 speed: float = 1.0, loop: bool = False):
+        self.speed = speed
+        self.loop = loop
+        self._scripts = split_connections(read_session(path))
+        self._i = 0
+        self._lock = threading.Lock()
+        self.matched = 0
+        self.mismatched = 0
+        self._server = _Server((host, port), _ReplayHandler)
+        self._server.replay = self  # type: ignore[attr-defined]
+        self._th: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def _next_script(self) -> list[Record] | None:
+        with self._lock:
+            if not self._scripts:
+                return None
+            if self._i >= len(self._scripts):
+                if not self.loop:
+                    return None
+                self._i = 0
+            script = self._scripts[self._i]
+            self._i += 1
+            return script
+
+    def _count(self, ok: bool) -> None:
+        with self._lock:
+            if ok:
+                self.matched += 1
+            else:
+                self.mismatched += 1
+
+    def start(self) -> "ReplayServer":
+        self._th = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._th.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Laser session capture tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("dump", help="print the records of a capture")
+    p.add_argument("path")
+    p = sub.add_parser("serve", help="replay a capture on a TCP port")
+    p.add_argument("path")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=2323)
+    p.add_argument("--speed", type=float, default=1.0, help="time scale, 0 = no delays")
+    p.add_argument("--loop", action="store_true", help="start over after the last connection")
+    p = sub.add_parser("bench", help="re-frame all RX chunks through LineReader")
+    p.add_argument("path")
+    p.add_argument("--repeat", type=int, default=100)
+    a = ap.parse_args()
+
+    if a.cmd == "dump":
+        for rec in read_session(a.path):
+            print(f"{rec.t:12.6f} {_KIND_NAMES.get(rec.kind, rec.kind):<5} {rec.data!r}")
+    elif a.cmd == "serve":
+        srv = ReplayServer(a.path, a.host, a.port, a.speed, a.loop).start()
+        print(f"Replaying {a.path} on {a.host}:{srv.port} (speed x{a.speed}, Ctrl+C to quit)")
+        try:
+            while True:
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            srv.stop()
+            print(f"requests matched {srv.matched}, mismatched {srv.mismatched}")
+    else:
+        chunks = [r.data for r in read_session(a.path) if r.kind == REC_RX]
+        nbytes = sum(len(c) for c in chunks)
+        t0 = time.perf_counter()
+        lines = 0
+        for _ in range(a.repeat):
+            reader = LineReader()
+            for c in chunks:
+                reader.feed(c)
+                lines += len(reader.drain())
+        dt = time.perf_counter() - t0
+        print(f"{len(chunks)} chunks, {nbytes} B x{a.repeat}: {lines} lines in {dt * 1000:.1f} ms "
+              f"({nbytes * a.repeat / max(dt, 1e-9) / 1e6:.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
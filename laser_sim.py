@@ -0,0 +1,236 @@
+# laser_sim.py
+"""
+Local stand-in for the laser controller ($-command protocol over TCP).
+
+    python laser_sim.py --port 2323 --latency-ms 20 --jitter-ms 10 --drop 0.01 --split 0.2
+
+Point the app (or LaserClient) at 127.0.0.1:<port>. Supported commands:
+$LOGIN <user>, $FIRE, $STANDBY, $STOP, $STATUS ?, $DTEMF ?, $LTEMF ?,
+$QSDELAY [?|<us>], $DFREQ [?|<hz>]. LTEMF follows a first-order thermal
+model that heats toward ambient+fire_rise while firing and cools back
+toward ambient otherwise.
+"""
+from __future__ import annotations
+import argparse
+import math
+import random
+import socketserver
+import threading
+import time
+from dataclasses import dataclass
+
+# บิตของ STATUS byte แรก (ตรงกับที่ LaserClient decode)
+ST_FIRE = 0x80
+ST_STANDBY = 0x40
+ST_NOT_READY = 0x01
+
+
+@dataclass
+class SimConfig:
+    latency_ms: float = 5.0      # เวลาตอบกลับเฉลี่ย
+    jitter_ms: float = 0.0       # +/- สุ่มแบบ uniform
+    drop: float = 0.0            # ความน่าจะเป็นที่จะไม่ตอบเลย
+    split: float = 0.0           # ความน่าจะเป็นที่คำตอบถูกส่งเป็น 2 ก้อน
+    split_gap_ms: float = 15.0
+    ambient: float = 26.0        # °C
+    fire_rise: float = 12.0      # LTEMF สูงสุด = ambient + fire_rise ขณะยิง
+    tau_heat: float = 120.0      # s
+    tau_cool: float = 300.0      # s
+    diode_set: float = 40.0      # DTEMF ขณะ STANDBY/FIRE
+    noise: float = 0.05          # °C
+    ready_after: float = 0.0     # s หลัง LOGIN ก่อนจะ Ready
+
+
+class LaserModel:
+    """Shared device state (one laser, any number of connections)."""
+
+    def __init__(self, cfg: SimConfig, rng: random.Random):
+        self.cfg = cfg
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.mode = "STOP"           # STOP / STANDBY / FIRE
+        self.user: str | None = None
+        self.login_ts = 0.0
+        self.qsdelay = 220
+        self.dfreq = 20
+        self.ltemf = cfg.ambient
+        self.dtemf = cfg.ambient
+        self._t = time.monotonic()
+
+    def _advance(self) -> None:
+        now = time.monotonic()
+        dt = now - self._t
+        self._t = now
+        c = self.cfg
+        if self.mode == "FIRE":
+            target, tau = c.ambient + c.fire_rise * (self.dfreq / 20.0), c.tau_heat
+        else:
+            target, tau = c.ambient, c.tau_cool
+        self.ltemf = target + (self.ltemf - target) * math.exp(-dt / max(tau, 1e-3))
+        d_target = c.diode_set if self.mode in ("FIRE", "STANDBY") else c.ambient
+        self.dtemf = d_target + (self.dtemf - d_target) * math.exp(-dt / 5.0)
+
+    def status_word(self) -> int:
+        st = 0
+        if self.mode == "FIRE":
+            st |= ST_FIRE
+        elif self.mode == "STANDBY":
+            st |= ST_STANDBY
+        if self.user is None or time.monotonic() - self.login_ts < self.cfg.ready_after:
+            st |= ST_NOT_READY
+        return st << 24
+
+    def handle(self, line: str) -> str:
+        parts = line.split()
+        if not parts:
+            return ""
+        head = parts[0].upper()
+        arg = parts[1] if len(parts) > 1 else ""
+        with self.lock:
+            self._advance()
+            if head == "$LOGIN":
+                self.user = arg or None
+                self.login_ts = time.monotonic()
+                return "$LOGIN OK" if self.user else "$LOGIN ERR"
+            if head in ("$FIRE", "$STANDBY", "$STOP"):
+                if self.user is None:
+                    return f"{head} ERR NOT LOGGED IN"
+                self.mode = head[1:]
+                return head
+            if head == "$STATUS":
+                return f"$STATUS {self.status_word():08X}"
+            if head == "$LTEMF":
+                return f"$LTEMF {self.ltemf + self.rng.gauss(0, self.cfg.noise):.1f}"
+            if head == "$DTEMF":
+                return f"$DTEMF {self.dtemf + self.rng.gauss(0, self.cfg.noise):.1f}"
+            if head in ("$QSDELAY", "$DFREQ"):
+                attr = "qsdelay" if head == "$QSDELAY" else "dfreq"
+                if arg and arg != "?":
+                    try:
+                        setattr(self, attr, int(float(arg)))
+                    except ValueError:
+                        return f"{head} ERR"
+                return f"{head} {getattr(self, attr)}"
+            return f"{head} ERR UNKNOWN"
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        srv: LaserSimulator = self.server.sim  # type: ignore[attr-defined]
+        srv._track(self.request, True)
+        buf = b""
+        try:
+            while True:
+                data = self.request.recv(1024)
+                if not data:
+                    return
+                buf += data
+                while b"\n" in buf:
+                    raw, buf = buf.split(b"\n", 1)
+                    line = raw.decode(errors="ignore").strip()
+                    if line:
+                        srv._reply(self.request, line)
+        except OSError:
+            return
+        finally:
+            srv._track(self.request, False)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class LaserSimulator:
+    """Threaded TCP server around LaserModel; port=0 picks a free port."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 2323,
+                 cfg: SimConfig | None = None, seed: int | None = None):
+        self.cfg = cfg or SimConfig()
+        self.rng = random.Random(seed)
+        self.model = LaserModel(self.cfg, self.rng)
+        self._server = _Server((host, port), _Handler)
+        self._server.sim = self  # type: ignore[attr-defined]
+        self._conns: set = set()
+        self._conns_lock = threading.Lock()
+        self._th: threading.Thread | None = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "LaserSimulator":
+        self._th = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._th.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_connections()
+
+    def drop_connections(self) -> None:
+        """Close every client socket (for reconnect testing)."""
+        with self._conns_lock:
+            conns = list(self._conns)
+        for c in conns:
+            try:
+                c.shutdown(2)
+                c.close()
+            except OSError:
+                pass
+
+    def _track(self, conn, alive: bool) -> None:
+        with self._conns_lock:
+            (self._conns.add if alive else self._conns.discard)(conn)
+
+    def _reply(self, conn, line: str) -> None:
+        resp = self.model.handle(line)
+        c = self.cfg
+        if not resp or self.rng.random() < c.drop:
+            return
+        delay = (c.latency_ms + self.rng.uniform(-c.jitter_ms, c.jitter_ms)) / 1000.0
+        if delay > 0:
+            time.sleep(delay)
+        data = (resp + "\n").encode()
+        if len(data) > 2 and self.rng.random() < c.split:
+            cut = self.rng.randint(1, len(data) - 1)
+            conn.sendall(data[:cut])
+            time.sleep(c.split_gap_ms / 1000.0)
+            conn.sendall(data[cut:])
+        else:
+            conn.sendall(data)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Laser controller simulator")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=2323)
+    ap.add_argument("--latency-ms", type=float, default=5.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--drop", type=float, default=0.0, help="probability of no reply")
+    ap.add_argument("--split", type=float, default=0.0, help="probability a reply is sent in 2 chunks")
+    ap.add_argument("--ambient", type=float, default=26.0)
+    ap.add_argument("--fire-rise", type=float, default=12.0)
+    ap.add_argument("--tau-heat", type=float, default=120.0)
+    ap.add_argument("--tau-cool", type=float, default=300.0)
+    ap.add_argument("--seed", type=int, default=None)
+    a = ap.parse_args()
+
+    cfg = SimConfig(
+        latency_ms=a.latency_ms, jitter_ms=a.jitter_ms, drop=a.drop, split=a.split,
+        ambient=a.ambient, fire_rise=a.fire_rise, tau_heat=a.tau_heat, tau_cool=a.tau_cool,
+    )
+    sim = LaserSimulator(a.host, a.port, cfg, seed=a.seed).start()
+    print(f"Laser simulator listening on {a.host}:{sim.port} (Ctrl+C to quit)")
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+# live_chart.py
+"""
+Live chart (FIRE/REST status + DTEMF/LTEMF) with two interchangeable backends:
+
+- TkLivePlot: plain Tk Canvas polylines plus a small axis/tick layer. Each
+  update only moves the coordinates of the existing line items. It needs
+  no matplotlib and is the default operator view.
+- MplLivePlot: matplotlib on FigureCanvasTkAgg with blitting. The figure
+  (axes, grids, ticks, legend) is rendered once and cached as a background
+  bitmap, and each update redraws only the line artists.
+
+Both implement render(status, tele) / reset() / destroy() and .widget, and
+share the same limit logic: a full redraw (axes, ticks) happens only when
+an axis limit has to move, and the limits leave headroom so that is rare.
+export_png() renders the same series with matplotlib (Agg) for snapshots,
+whichever backend is on screen. matplotlib is imported only when needed.
+
+minmax_decimate() cuts a series down to about two points per pixel column
+(the min and max of each column), so the cost of drawing a line stays
+bounded however long the window is or however fast we sample, and spikes
+stay visible.
+"""
+from __future__ import annotations
+import tkinter as tk
+from datetime import datetime
+
+import numpy as np
+
+X_HEADROOM = 0.10               # เผื่อขวามือ 10% ของช่วงเวลา ...
+X_MIN_HEADROOM = 30 / 86400.0   # ... แต่ไม่น้อยกว่า 30 วินาที (หน่วยแกน = วัน)
+Y_PAD = 0.10
+
+
+class BlitManager:
+    def __init__(self, canvas, artists):
+        self.canvas = canvas
+        self._bg = None
+        self._artists = list(artists)
+        for a in self._artists:
+            a.set_animated(True)
+        canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        # ทุกครั้งที่วาดเต็ม (rescale / resize) → จำพื้นหลังใหม่ แล้ววาดเส้นทับ
+        self._bg = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        fig = self.canvas.figure
+        for a in self._artists:
+            fig.draw_artist(a)
+
+    def redraw(self) -> None:
+        """Full redraw (call after changing limits or anything static)."""
+        self._bg = None
+        self.canvas.draw_idle()
+
+    def update(self) -> None:
+        """Redraw only the line artists over the cached background."""
+        if self._bg is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._bg)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+
+def next_xlim(first: float, last: float, cur: tuple[float, float]) -> tuple[float, float] | None:
+    """New x limits when the data left cur (or cur wastes too much room), else None."""
+    lo, hi = cur
+    if lo <= first and last <= hi and (first - lo) <= 2 * X_HEADROOM * max(hi - lo, 1e-9):
+        return None
+    return first, last + max(X_MIN_HEADROOM, (last - first) * X_HEADROOM)
+
+
+def next_ylim(ymin: float, ymax: float, cur: tuple[float, float]) -> tuple[float, float] | None:
+    """New y limits when [ymin, ymax] no longer fits cur or uses under half of it, else None."""
+    if ymin == ymax:
+        ymin -= 1
+        ymax += 1
+    lo, hi = cur
+    if lo <= ymin and ymax <= hi and (ymax - ymin) >= 0.5 * (hi - lo) / (1 + 2 * Y_PAD):
+        return None
+    pad = (ymax - ymin) * Y_PAD
+    return ymin - pad, ymax + pad
+
+
+def minmax_decimate(x: np.ndarray, y: np.ndarray, nbins: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Keep the min and max of y in each of nbins equal-width x bins (x sorted).
+    Bins with only NaN stay NaN, so gaps in the data stay gaps on the chart.
+    Returns the input unchanged when it is already small enough.
+    """
+    n = len(x)
+    if nbins < 1 or n <= 2 * nbins:
+        return x, y
+    x0, x1 = x[0], x[-1]
+    if not x1 > x0:
+        return x, y
+    idx = ((x - x0) * (nbins / (x1 - x0))).astype(np.int64)
+    np.minimum(idx, nbins - 1, out=idx)
+    starts = np.flatnonzero(np.r_[True, idx[1:] != idx[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    out_x = np.empty(2 * len(starts), dtype=x.dtype)
+    out_y = np.empty(2 * len(starts), dtype=y.dtype)
+    out_x[0::2] = x[starts]
+    out_x[1::2] = x[ends]
+    out_y[0::2] = np.fmin.reduceat(y, starts)
+    out_y[1::2] = np.fmax.reduceat(y, starts)
+    return out_x, out_y
+
+
+def _x_range(series) -> tuple[float, float] | None:
+    return (series.first_t() / 86400.0, series.last_t() / 86400.0) if len(series) else None
+
+
+def _decimate_for(x, y, xlim, width_px: float):
+    """Decimate x/y to the pixel columns the data covers on an axis width_px wide."""
+    if len(x) > 1:
+        x0, x1 = xlim
+        frac = (x[-1] - x[0]) / (x1 - x0) if x1 > x0 else 1.0
+        x, y = minmax_decimate(x, y, max(1, int(width_px * min(1.0, frac))))
+    return x, y
+
+
+def _status_steps(x, y):
+    """Step line through (x, y): the value holds until the next point."""
+    if len(x) < 2:
+        return x, y
+    return np.repeat(x, 2)[1:], np.repeat(y, 2)[:-1]
+
+
+# ---------------- Tk Canvas backend ----------------
+COLORS = ("#1f77b4", "#ff7f0e")     # สีเดียวกับ matplotlib C0 / C1
+_TIME_STEPS = (1, 2, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800)
+
+
+def nice_ticks(lo: float, hi: float, n: int = 5) -> list[float]:
+    """About n round-valued ticks (1/2/5 x 10^k) between lo and hi."""
+    span = hi - lo
+    if not span > 0:
+        return [lo]
+    raw = span / n
+    mag = 10 ** np.floor(np.log10(raw))
+    step = next(m * mag for m in (1, 2, 5, 10) if m * mag >= raw)
+    first = np.ceil(lo / step) * step
+    return [float(v) for v in np.arange(first, hi + step * 1e-9, step)]
+
+
+def time_ticks(lo: float, hi: float, tz, n: int = 6) -> tuple[list[float], str]:
+    """Tick positions (days since epoch) on round local times, and the strftime format."""
+    span_s = (hi - lo) * 86400.0
+    step = next((s for s in _TIME_STEPS if span_s / s <= n), _TIME_STEPS[-1])
+    off = datetime.fromtimestamp(lo * 86400.0, tz).utcoffset()
+    off_s = off.total_seconds() if off else 0.0
+    first = np.ceil((lo * 86400.0 + off_s) / step) * step - off_s
+    ticks = [float(t) / 86400.0 for t in np.arange(first, hi * 86400.0 + 1e-6, step)]
+    return ticks, ("%H:%M" if step >= 60 else "%H:%M:%S")
+
+
+class _TkPanel:
+    """One axes box on the canvas: its limits, axis layer and line items."""
+
+    def __init__(self, cv: tk.Canvas, tag: str, ylabel: str, ylim, tz):
+        self.cv = cv
+        self.tag = tag
+        self.ylabel = ylabel
+        self.tz = tz
+        self.xlim = (0.0, 1.0)
+        self.ylim = tuple(ylim)
+        self.box = (0, 0, 1, 1)                    # x0, y0, x1, y1 (pixel)
+        self.lines: dict[str, list[int]] = {}      # trace → canvas items (1 ต่อช่วงที่ไม่มี NaN)
+
+    # API เดียวกับ matplotlib Axes เท่าที่ _apply_limits ใช้
+    def get_xlim(self):
+        return self.xlim
+
+    def set_xlim(self, lo, hi):
+        self.xlim = (lo, hi)
+
+    def get_ylim(self):
+        return self.ylim
+
+    def set_ylim(self, lo, hi):
+        self.ylim = (lo, hi)
+
+    @property
+    def width(self) -> float:
+        return self.box[2] - self.box[0]
+
+    def draw_axes(self) -> None:
+        cv, (bx0, by0, bx1, by1) = self.cv, self.box
+        atag = self.tag + "-axis"
+        cv.delete(atag)
+        cv.create_rectangle(bx0, by0, bx1, by1, outline="#444", tags=atag)
+        x0, x1 = self.xlim
+        y0, y1 = self.ylim
+        for v in nice_ticks(y0, y1):
+            py = self._py(v)
+            cv.create_line(bx0, py, bx1, py, fill="#ddd", dash=(1, 3), tags=atag)
+            cv.create_text(bx0 - 4, py, text=f"{v:g}", anchor="e", font=("TkDefaultFont", 8), tags=atag)
+        ticks, fmt = time_ticks(x0, x1, self.tz)
+        for v in ticks:
+            px = self._px(v)
+            cv.create_line(px, by0, px, by1, fill="#ddd", dash=(1, 3), tags=atag)
+            label = datetime.fromtimestamp(v * 86400.0, self.tz).strftime(fmt)
+            cv.create_text(px, by1 + 3, text=label, anchor="n", font=("TkDefaultFont", 8), tags=atag)
+        cv.create_text(bx0 - 40, (by0 + by1) / 2, text=self.ylabel, angle=90,
+                       font=("TkDefaultFont", 8), tags=atag)
+        cv.tag_lower(atag)
+
+    def _px(self, x):
+        x0, x1 = self.xlim
+        return self.box[0] + (x - x0) * (self.width / (x1 - x0 or 1.0))
+
+    def _py(self, y):
+        y0, y1 = self.ylim
+        return self.box[3] - (y - y0) * ((self.box[3] - self.box[1]) / (y1 - y0 or 1.0))
+
+    def set_line(self, name: str, x, y, color: str, width: float) -> None:
+        """Move the trace's polylines to (x, y); NaN splits the line into segments."""
+        pts = np.column_stack((self._px(np.asarray(x, dtype=np.float64)),
+                               self._py(np.asarray(y, dtype=np.float64))))
+        ok = ~np.isnan(pts[:, 1])
+        segs = []
+        if ok.any():
+            edges = np.flatnonzero(np.diff(np.r_[0, ok.view(np.int8), 0]))
+            segs = [pts[a:b] for a, b in zip(edges[0::2], edges[1::2]) if b - a >= 2]
+        items = self.lines.setdefault(name, [])
+        while len(items) < len(segs):
+            items.append(self.cv.create_line(0, 0, 0, 0, fill=color, width=width, tags=self.tag))
+        for i, item in enumerate(items):
+            if i < len(segs):
+                self.cv.coords(item, *segs[i].ravel().tolist())
+                self.cv.itemconfigure(item, state="normal")
+            else:
+                self.cv.itemconfigure(item, state="hidden")
+
+
+class TkLivePlot:
+    """Live chart drawn directly on a Tk Canvas (no matplotlib)."""
+
+    MARGIN_L, MARGIN_R, MARGIN_T, MARGIN_B, GAP = 58, 12, 10, 22, 28
+
+    def __init__(self, master, tz):
+        self.tz = tz
+        self.widget = tk.Canvas(master, bg="white", highlightthickness=0)
+        self.ax1 = _TkPanel(self.widget, "status", "FIRE (1) / REST (0)", (-0.2, 1.2), tz)
+        self.ax2 = _TkPanel(self.widget, "tele", "DTEMF / LTEMF", (0.0, 1.0), tz)
+        self._size = (0, 0)
+        self._legend = False
+        self.widget.bind("<Configure>", lambda e: self._layout())
+
+    def _layout(self) -> None:
+        w, h = self.widget.winfo_width(), self.widget.winfo_height()
+        if (w, h) == self._size or w < 100 or h < 100:
+            return
+        self._size = (w, h)
+        L, R, T, B, G = self.MARGIN_L, self.MARGIN_R, self.MARGIN_T, self.MARGIN_B, self.GAP
+        ph = (h - T - B - G) / 2
+        self.ax1.box = (L, T, w - R, T + ph)
+        self.ax2.box = (L, T + ph + G, w - R, h - B)
+        self._redraw_axes()
+
+    def _redraw_axes(self) -> None:
+        self.ax1.draw_axes()
+        self.ax2.draw_axes()
+        self.widget.delete("legend")
+        x, y = self.ax2.box[0] + 8, self.ax2.box[1] + 8
+        for i, name in enumerate(("DTEMF", "LTEMF")):
+            yy = y + i * 14
+            self.widget.create_line(x, yy, x + 18, yy, fill=COLORS[i], width=2, tags="legend")
+            self.widget.create_text(x + 22, yy, text=name, anchor="w", font=("TkDefaultFont", 8), tags="legend")
+
+    def reset(self) -> None:
+        for p in (self.ax1, self.ax2):
+            for items in p.lines.values():
+                for item in items:
+                    self.widget.itemconfigure(item, state="hidden")
+        self.ax2.ylim = (0.0, 1.0)
+        self._redraw_axes()
+
+    def render(self, status, tele) -> None:
+        if self._size == (0, 0):
+            self._layout()
+            if self._size == (0, 0):
+                return  # ยังไม่ได้แสดงบนจอ
+        if _apply_limits(self.ax1, self.ax2, status, tele):
+            self._redraw_axes()
+
+        sx, sy = _decimate_for(status.t / 86400.0, status.values(0), self.ax1.xlim, self.ax1.width)
+        self.ax1.set_line("status", *_status_steps(sx, sy), COLORS[0], 2)
+        tx = tele.t / 86400.0
+        for col in (0, 1):
+            x, y = _decimate_for(tx, tele.values(col), self.ax2.xlim, self.ax2.width)
+            self.ax2.set_line(f"t{col}", x, y, COLORS[col], 1.6)
+
+    def destroy(self) -> None:
+        self.widget.destroy()
+
+
+# ---------------- matplotlib backend ----------------
+class MplLivePlot:
+    """The original matplotlib chart (FigureCanvasTkAgg), blitted."""
+
+    def __init__(self, master, tz):
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        self.tz = tz
+        self.fig = _make_figure(tz)
+        self.ax1, self.ax2 = self.fig.axes
+        self.line_status, = self.ax1.lines
+        self.line_dtemf, self.line_ltemf = self.ax2.lines
+        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+        self.blit = BlitManager(self.canvas, [self.line_status, self.line_dtemf, self.line_ltemf])
+        self.canvas.draw()
+        self.widget = self.canvas.get_tk_widget()
+
+    def reset(self) -> None:
+        for line in (self.line_status, self.line_dtemf, self.line_ltemf):
+            line.set_data([], [])
+        now = datetime.now(self.tz).timestamp() / 86400.0
+        for ax in (self.ax1, self.ax2):
+            ax.set_xlim(now - 300 / 86400.0, now + 5 / 86400.0)
+        self.ax1.set_ylim(-0.2, 1.2)
+        self.ax2.set_ylim(0, 1)
+        self.blit.redraw()
+
+    def render(self, status, tele) -> None:
+        rescale = _apply_limits(self.ax1, self.ax2, status, tele)
+        _set_lines(self.ax1, self.ax2, status, tele)
+        if rescale:
+            self.blit.redraw()
+        else:
+            self.blit.update()
+
+    def destroy(self) -> None:
+        self.widget.destroy()
+
+
+def _make_figure(tz):
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(8, 5.2), dpi=100)
+    ax1 = fig.add_subplot(211)
+    ax1.set_ylim(-0.2, 1.2); ax1.set_ylabel("FIRE (1) / REST (0)")
+    ax1.grid(True, linestyle=":", alpha=0.5)
+    ax1.xaxis_date(tz)
+    ax1.plot([], [], lw=2, drawstyle="steps-post")
+    ax2 = fig.add_subplot(212)
+    ax2.set_ylabel("DTEMF / LTEMF")
+    ax2.grid(True, linestyle=":", alpha=0.5)
+    ax2.xaxis_date(tz)
+    ax2.plot([], [], lw=1.6, label="DTEMF")
+    ax2.plot([], [], lw=1.6, label="LTEMF")
+    ax2.legend(loc="upper left")
+    return fig
+
+
+def _apply_limits(ax1, ax2, status, tele) -> bool:
+    rescale = False
+    xr = _x_range(status)
+    lim = next_xlim(*xr, ax1.get_xlim()) if xr else None
+    if lim:
+        ax1.set_xlim(*lim); rescale = True
+    xr = _x_range(tele)
+    lim = next_xlim(*xr, ax2.get_xlim()) if xr else None
+    if lim:
+        ax2.set_xlim(*lim); rescale = True
+    mm = tele.min_max()
+    lim = next_ylim(*mm, ax2.get_ylim()) if mm else None
+    if lim:
+        ax2.set_ylim(*lim); rescale = True
+    return rescale
+
+
+def _set_lines(ax1, ax2, status, tele) -> None:
+    line_status, = ax1.lines
+    line_d, line_l = ax2.lines
+    line_status.set_data(*_decimate_for(status.t / 86400.0, status.values(0),
+                                        ax1.get_xlim(), ax1.bbox.width))
+    tx = tele.t / 86400.0
+    line_d.set_data(*_decimate_for(tx, tele.values(0), ax2.get_xlim(), ax2.bbox.width))
+    line_l.set_data(*_decimate_for(tx, tele.values(1), ax2.get_xlim(), ax2.bbox.width))
+
+
+def export_png(path: str, status, tele, tz) -> None:
+    """Render the current window to a PNG with matplotlib (Agg), independent of the live backend."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    fig = _make_figure(tz)
+    FigureCanvasAgg(fig)
+    ax1, ax2 = fig.axes
+    _apply_limits(ax1, ax2, status, tele)
+    _set_lines(ax1, ax2, status, tele)
+    fig.savefig(path, dpi=120, bbox_inches="tight")
+
+
+LIVE_PLOTS = {"tk": TkLivePlot, "matplotlib": MplLivePlot}
+
+
+def make_live_plot(kind: str, master, tz):
+    """kind: "tk" (default) or "matplotlib"."""
+    return LIVE_PLOTS.get(kind, TkLivePlot)(master, tz)
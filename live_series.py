@@ -0,0 +1,275 @@
+# live_series.py
+"""
+Fixed-capacity time series for the live chart.
+
+Timestamps are float64 epoch seconds, values float32 (one column per line,
+NaN = no reading). Each point is written twice (at i and i + capacity) so
+the live window is always one contiguous slice: append, trimming to the
+time window and view() are O(1) and memory stays flat however long the
+app runs. Min/max over the window are kept with monotonic deques, so
+autoscale does not rescan the data.
+
+StepSeries is the FIRE/REST counterpart: it stores transitions only.
+AggSeries keeps streaming min/max per time bucket, and TieredSeries
+feeds one stream into raw + bucketed tiers (CHART_TIERS) so a long chart
+window never holds or draws every raw sample.
+"""
+from __future__ import annotations
+from collections import deque
+
+import numpy as np
+
+
+class RingSeries:
+    def __init__(self, capacity: int, ncols: int = 1, window_sec: float | None = None):
+        self.capacity = int(capacity)
+        self.ncols = ncols
+        self.window_sec = window_sec
+        self._t = np.zeros(2 * self.capacity, dtype=np.float64)
+        self._v = np.full((2 * self.capacity, ncols), np.nan, dtype=np.float32)
+        self._start = 0          # ตำแหน่งของจุดแรกใน buffer (0..capacity-1)
+        self._size = 0
+        self._seq = 0            # ลำดับของจุดถัดไป (นับสะสม ไม่วน)
+        self._mins: deque[tuple[int, float]] = deque()   # (seq, value) ค่าเพิ่มขึ้นเรื่อย ๆ
+        self._maxs: deque[tuple[int, float]] = deque()   # (seq, value) ค่าลดลงเรื่อย ๆ
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self) -> None:
+        self._start = self._size = 0
+        self._mins.clear()
+        self._maxs.clear()
+
+    def append(self, t: float, *values: float | None) -> None:
+        if self._size == self.capacity:
+            self._drop_first()
+        i = (self._start + self._size) % self.capacity
+        row = [np.nan if v is None else v for v in values]
+        self._t[i] = self._t[i + self.capacity] = t
+        self._v[i] = self._v[i + self.capacity] = row
+        self._size += 1
+        seq = self._seq
+        self._seq += 1
+        for v in row:
+            if v != v:
+                continue
+            while self._mins and self._mins[-1][1] >= v:
+                self._mins.pop()
+            self._mins.append((seq, v))
+            while self._maxs and self._maxs[-1][1] <= v:
+                self._maxs.pop()
+            self._maxs.append((seq, v))
+        if self.window_sec is not None:
+            cutoff = t - self.window_sec
+            while self._size and self._t[self._start] < cutoff:
+                self._drop_first()
+
+    def _drop_first(self) -> None:
+        first = self._seq - self._size
+        while self._mins and self._mins[0][0] <= first:
+            self._mins.popleft()
+        while self._maxs and self._maxs[0][0] <= first:
+            self._maxs.popleft()
+        self._start = (self._start + 1) % self.capacity
+        self._size -= 1
+
+    @property
+    def t(self) -> np.ndarray:
+        """Timestamps of the window, oldest first (a view, do not modify)."""
+        return self._t[self._start:self._start + self._size]
+
+    def values(self, col: int = 0) -> np.ndarray:
+        return self._v[self._start:self._start + self._size, col]
+
+    def rows(self) -> np.ndarray:
+        """All columns of the window, shape (len, ncols) (a view)."""
+        return self._v[self._start:self._start + self._size]
+
+    def first_t(self) -> float | None:
+        return float(self._t[self._start]) if self._size else None
+
+    def last_t(self) -> float | None:
+        return float(self._t[self._start + self._size - 1]) if self._size else None
+
+    def min_max(self) -> tuple[float, float] | None:
+        """Min and max of all finite values in the window, or None."""
+        if not self._mins:
+            return None
+        return float(self._mins[0][1]), float(self._maxs[0][1])
+
+
+class StepSeries:
+    """
+    Piecewise-constant series (FIRE/REST) kept as its transitions only.
+
+    set(t, value) records a point only when the value changes and otherwise
+    just moves the end of the series to t, so memory and drawing cost grow
+    with the number of transitions, not with elapsed time, and edges keep
+    their exact timestamps. t / values() include a final point at the end
+    time so the last level is drawn up to "now". Same read API as RingSeries.
+    """
+
+    def __init__(self, window_sec: float | None = None):
+        self.window_sec = window_sec
+        self._t: deque[float] = deque()
+        self._v: deque[float] = deque()
+        self._end = 0.0
+
+    def __len__(self) -> int:
+        return len(self._t) + 1 if self._t else 0
+
+    def clear(self) -> None:
+        self._t.clear()
+        self._v.clear()
+
+    def set(self, t: float, value: float) -> None:
+        if not self._v or self._v[-1] != value:
+            self._t.append(t)
+            self._v.append(value)
+        self._end = max(self._end, t)
+        if self.window_sec is not None:
+            cutoff = self._end - self.window_sec
+            # ทิ้ง transition ที่เก่ากว่า window แต่คงระดับ ณ ต้น window ไว้
+            while len(self._t) >= 2 and self._t[1] <= cutoff:
+                self._t.popleft()
+                self._v.popleft()
+            if self._t and self._t[0] < cutoff:
+                self._t[0] = cutoff
+
+    @property
+    def t(self) -> np.ndarray:
+        if not self._t:
+            return np.empty(0, dtype=np.float64)
+        return np.array([*self._t, self._end], dtype=np.float64)
+
+    def values(self, col: int = 0) -> np.ndarray:
+        if not self._v:
+            return np.empty(0, dtype=np.float32)
+        return np.array([*self._v, self._v[-1]], dtype=np.float32)
+
+    def first_t(self) -> float | None:
+        return self._t[0] if self._t else None
+
+    def last_t(self) -> float | None:
+        return self._end if self._t else None
+
+    def clipped(self, window_sec: float) -> "StepSeries":
+        """Copy limited to the last window_sec seconds (for a shorter chart window)."""
+        out = StepSeries(window_sec)
+        for t, v in zip(self._t, self._v):
+            out.set(t, v)
+        if self._t:
+            out.set(self._end, self._v[-1])
+        return out
+
+
+class AggSeries:
+    """
+    Streaming min/max per fixed time bucket (bucket_sec), kept for
+    window_sec. Finished buckets live in a RingSeries; the open bucket is
+    folded in as samples arrive. For drawing, t / values() give two points
+    per bucket (its min, then its max) so spikes stay visible.
+    """
+
+    def __init__(self, ncols: int, bucket_sec: float, window_sec: float):
+        self.ncols = ncols
+        self.bucket_sec = float(bucket_sec)
+        self.window_sec = window_sec
+        # คอลัมน์: [min ทุกคอลัมน์ | max ทุกคอลัมน์]
+        self._done = RingSeries(int(window_sec / bucket_sec) + 2, 2 * ncols, window_sec)
+        self._open_t: float | None = None
+        self._lo = np.full(ncols, np.nan)
+        self._hi = np.full(ncols, np.nan)
+
+    def clear(self) -> None:
+        self._done.clear()
+        self._open_t = None
+
+    def add(self, t: float, *values: float | None) -> None:
+        b = (t // self.bucket_sec) * self.bucket_sec
+        if b != self._open_t:
+            self._close()
+            self._open_t = b
+            self._lo[:] = np.nan
+            self._hi[:] = np.nan
+        for c, v in enumerate(values):
+            if v is None or v != v:
+                continue
+            self._lo[c] = np.fmin(self._lo[c], v)
+            self._hi[c] = np.fmax(self._hi[c], v)
+
+    def _open_row(self) -> np.ndarray:
+        return np.concatenate((self._lo, self._hi))
+
+    def _close(self) -> None:
+        if self._open_t is not None:
+            self._done.append(self._open_t, *self._open_row().tolist())
+
+    def _rows(self) -> tuple[np.ndarray, np.ndarray]:
+        t, v = self._done.t, self._done.rows()
+        if self._open_t is None:
+            return t, v
+        return np.r_[t, self._open_t], np.vstack((v, self._open_row()[None, :]))
+
+    def __len__(self) -> int:
+        n = len(self._done) + (self._open_t is not None)
+        return 2 * n
+
+    @property
+    def t(self) -> np.ndarray:
+        t, _ = self._rows()
+        out = np.empty(2 * len(t))
+        out[0::2] = t
+        out[1::2] = t + self.bucket_sec / 2
+        return out
+
+    def values(self, col: int = 0) -> np.ndarray:
+        _, v = self._rows()
+        out = np.empty(2 * len(v), dtype=np.float32)
+        out[0::2] = v[:, col]
+        out[1::2] = v[:, self.ncols + col]
+        return out
+
+    def first_t(self) -> float | None:
+        f = self._done.first_t()
+        return f if f is not None else self._open_t
+
+    def last_t(self) -> float | None:
+        return None if self._open_t is None else self._open_t + self.bucket_sec / 2
+
+    def min_max(self) -> tuple[float, float] | None:
+        mm = self._done.min_max()
+        if self._open_t is None or not np.isfinite(self._lo).any():
+            return mm
+        lo, hi = float(np.nanmin(self._lo)), float(np.nanmax(self._hi))
+        return (lo, hi) if mm is None else (min(mm[0], lo), max(mm[1], hi))
+
+
+# (ชื่อ, ขนาด bucket วินาที (0 = raw), ช่วงที่แสดง วินาที)
+CHART_TIERS = (("5 min", 0, 300), ("1 h", 10, 3600), ("24 h", 60, 86400))
+
+
+class TieredSeries:
+    """One telemetry stream kept at every resolution in tiers at once; add() is O(1)."""
+
+    def __init__(self, ncols: int, min_period: float, tiers=CHART_TIERS):
+        self.tiers: dict[str, RingSeries | AggSeries] = {}
+        self.windows: dict[str, float] = {}
+        for name, bucket, window in tiers:
+            if bucket:
+                self.tiers[name] = AggSeries(ncols, bucket, window)
+            else:
+                self.tiers[name] = RingSeries(int(window / min_period) + 16, ncols, window)
+            self.windows[name] = window
+
+    def add(self, t: float, *values: float | None) -> None:
+        for s in self.tiers.values():
+            if isinstance(s, AggSeries):
+                s.add(t, *values)
+            else:
+                s.append(t, *values)
+
+    def clear(self) -> None:
+        for s in self.tiers.values():
+            s.clear()
@@ -0,0 +1,70 @@
+# log_pane.py
+"""
+Batched writer for the Terminal / Scheduler log Text widgets.
+
+The app drains msg_q once per tick and hands each pane its batch; LogPane
+turns that into one insert per widget, keeps the widget at max_lines and
+collapses repeats, so a flood of messages cannot stall the Tk loop.
+"""
+from __future__ import annotations
+import re
+import tkinter as tk
+
+# "[HH:MM:SS] " หรือ "[SCHED#n] [HH:MM:SS] " ที่ต้นข้อความ: ไม่นับตอนเทียบข้อความซ้ำ
+LOG_STAMP_RE = re.compile(r"^(\[SCHED#\d+\] )?\[\d{2}:\d{2}:\d{2}\] ")
+
+
+class LogPane:
+    """
+    Writes msg_q messages into a Text widget one batch per tick: a single
+    insert + see(END), the widget capped at max_lines by trimming from the
+    top, and a message identical to the previous one (timestamp aside)
+    shown once with a (xN) counter instead of repeated.
+    """
+
+    def __init__(self, text: tk.Text, max_lines: int = 5000):
+        self.text = text
+        self.max_lines = max_lines
+        self._key = None        # ข้อความล่าสุดที่แสดง (ตัด timestamp ออก)
+        self._last = ""         # ข้อความล่าสุดตามที่ได้รับ (timestamp ล่าสุด)
+        self._count = 0
+        self._nlines = 0        # จำนวนบรรทัดของข้อความล่าสุดใน widget
+
+    @staticmethod
+    def _fmt(msg: str, count: int) -> str:
+        return msg + (f"  (x{count})" if count > 1 else "") + "\n"
+
+    def write(self, msgs: list[str]) -> None:
+        if not msgs:
+            return
+        entries: list[list] = []        # [key, msg, count]
+        rewrite = False
+        for msg in msgs:
+            key = LOG_STAMP_RE.sub("", msg)
+            if entries and entries[-1][0] == key:
+                entries[-1][1] = msg
+                entries[-1][2] += 1
+            elif not entries and key == self._key:
+                self._last = msg
+                self._count += 1
+                rewrite = True
+            else:
+                entries.append([key, msg, 1])
+        t = self.text
+        if rewrite and self._nlines:
+            # แทนที่ข้อความล่าสุดด้วยตัวนับที่อัปเดตแล้ว
+            t.delete(f"end-{self._nlines + 1}l linestart", "end-1c")
+            t.insert(tk.END, self._fmt(self._last, self._count))
+        if entries:
+            t.insert(tk.END, "".join(self._fmt(m, c) for _, m, c in entries))
+            self._key, self._last, self._count = entries[-1]
+        self._nlines = self._last.count("\n") + 1
+        lines = int(t.index("end-1c").split(".")[0]) - 1
+        if lines > self.max_lines:
+            t.delete("1.0", f"{lines - self.max_lines + 1}.0")
+        t.see(tk.END)
+
+    def clear(self) -> None:
+        self.text.delete("1.0", tk.END)
+        self._key = None
+        self._nlines = 0
@@ -0,0 +1,253 @@
+# telemetry.py
+"""
+One sampler owns the periodic DTEMF/LTEMF/STATUS reads and fans each
+immutable TelemetrySample out to any number of subscribers (chart/labels,
+CSV, over-temp guard, ...). Every subscriber has its own bounded queue, so
+a slow consumer only drops its own oldest samples (counted in .dropped)
+and never delays the sampler or the other consumers.
+
+How often it samples is decided by a SamplingPolicy: one rate per state
+("fire" / "rest" / "idle"), a faster burst right after every state change,
+and a hard cap on the rate whatever the configuration says.
+
+Samples are taken on an absolute schedule: slot k of period P is due at
+wall-clock time k*P (e.g. :00, :02, :04 for P=2 s), converted to a
+monotonic deadline, so query/write time never accumulates as drift. Slots
+that pass without a sample (late, BUSY, paused) are counted, not made up.
+"""
+from __future__ import annotations
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+from laser_client import LaserStatus, decode_status, parse_reply_float
+
+
+@dataclass(frozen=True)
+class TelemetrySample:
+    seq: int
+    slot: float                    # epoch seconds of the grid slot (multiple of the period)
+    mono: float                    # time.monotonic() when the replies arrived
+    wall: datetime                 # the grid slot as a tz-aware datetime
+    missed: int                    # slots with no sample since the previous sample
+    dtemf: float | None
+    ltemf: float | None
+    status: LaserStatus | None
+    replies: tuple[str, ...]       # raw replies in SAMPLE_CMDS order
+
+
+STATE_FIRE = "fire"     # กำลังยิง (manual หรือ scheduler)
+STATE_REST = "rest"     # มีโปรแกรม scheduler ทำงานอยู่ แต่อยู่ช่วง REST / รอเวลาเริ่ม
+STATE_IDLE = "idle"     # ไม่มีอะไรทำงาน
+
+MIN_PERIOD_SEC = 0.05   # คาบต่ำสุดที่ยอมให้ (คาบ 0 ทำให้ _next_slot หารด้วยศูนย์)
+
+
+@dataclass
+class SamplingPolicy:
+    """Sampling period (s) per state, burst after transitions, and the hard cap."""
+    fire_sec: float = 0.25
+    rest_sec: float = 2.0
+    idle_sec: float = 5.0
+    burst_sec: float = 0.25          # period during the burst window
+    burst_for_sec: float = 5.0       # burst length after a FIRE/STANDBY transition
+    min_sec: float = 0.2             # hard cap: never faster than this
+    _state: str | None = field(default=None, repr=False)
+    _burst_until: float = field(default=0.0, repr=False)
+
+    def burst(self, now: float | None = None) -> None:
+        self._burst_until = (time.monotonic() if now is None else now) + self.burst_for_sec
+
+    def interval(self, state: str, now: float | None = None) -> float:
+        now = time.monotonic() if now is None else now
+        if state != self._state:
+            if self._state is not None:
+                self.burst(now)
+            self._state = state
+        period = {STATE_FIRE: self.fire_sec, STATE_REST: self.rest_sec}.get(state, self.idle_sec)
+        if now < self._burst_until:
+            period = min(period, self.burst_sec)
+        return max(self.min_sec, MIN_PERIOD_SEC, period)
+
+    def to_dict(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if not k.startswith("_")}
+
+    def update(self, d: dict) -> None:
+        """
+        Apply the keys of d that are fields. Periods must be > 0 and
+        burst_for_sec >= 0; otherwise ValueError and nothing is changed.
+        """
+        new = {}
+        for k in self.to_dict():
+            if k not in d:
+                continue
+            v = float(d[k])
+            if not (v >= 0 if k == "burst_for_sec" else v > 0) or math.isinf(v):
+                raise ValueError(f"{k} must be {'>= 0' if k == 'burst_for_sec' else '> 0'}, got {d[k]!r}")
+            new[k] = v
+        for k, v in new.items():
+            setattr(self, k, v)
+
+
+class Subscription:
+    """Bounded per-consumer queue; when full the oldest sample is dropped."""
+
+    def __init__(self, name: str, maxlen: int):
+        self.name = name
+        self._q: deque[TelemetrySample] = deque()
+        self.maxlen = max(1, maxlen)
+        self._cv = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, s: TelemetrySample) -> None:
+        with self._cv:
+            if len(self._q) >= self.maxlen:
+                self._q.popleft()
+                self.dropped += 1
+            self._q.append(s)
+            self._cv.notify()
+
+    def get(self, timeout: float | None = None) -> TelemetrySample | None:
+        """Next sample in order, or None on timeout / after close()."""
+        with self._cv:
+            if not self._q and not self.closed:
+                self._cv.wait(timeout)
+            return self._q.popleft() if self._q else None
+
+    def drain(self) -> list[TelemetrySample]:
+        """Everything queued, oldest first (non-blocking; for Tk after() polling)."""
+        with self._cv:
+            items = list(self._q)
+            self._q.clear()
+            return items
+
+    def close(self) -> None:
+        with self._cv:
+            self.closed = True
+            self._cv.notify_all()
+
+
+class TelemetrySampler(threading.Thread):
+    """
+    read() -> list of replies (SAMPLE_CMDS order) or None when there is
+    nothing to publish (not connected, BUSY, paused). state() -> STATE_*
+    picks the policy rate; without it the sampler stays at the idle rate.
+    """
+
+    TICK = 0.1  # เช็ค state ใหม่ระหว่างรอ เพื่อเร่งทันทีเมื่อเริ่ม FIRE
+
+    def __init__(self, read, policy: SamplingPolicy | None = None, state=None, tz=None,
+                 name: str = "telemetry"):
+        super().__init__(name=name, daemon=True)
+        self._read = read
+        self.policy = policy or SamplingPolicy()
+        self._state = state or (lambda: STATE_IDLE)
+        self.tz = tz
+        self._subs: list[Subscription] = []
+        self._lock = threading.Lock()
+        self._stop_ev = threading.Event()
+        self._seq = 0
+        self.missed = 0                 # slot ที่ไม่มี sample ทั้งหมดตั้งแต่เริ่ม
+        self._missed_since = 0
+        self.last: TelemetrySample | None = None
+
+    def subscribe(self, name: str, maxlen: int = 1) -> Subscription:
+        sub = Subscription(name, maxlen)
+        with self._lock:
+            self._subs.append(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+        sub.close()
+
+    def stop(self) -> None:
+        """Stop sampling and close every subscription, so blocked get() calls return None."""
+        self._stop_ev.set()
+        with self._lock:
+            subs, self._subs = self._subs, []
+        for sub in subs:
+            sub.close()
+
+    def current_interval(self) -> float:
+        try:
+            state = self._state()
+        except Exception:
+            state = STATE_IDLE
+        return self.policy.interval(state)
+
+    def _miss(self, n: int) -> None:
+        self.missed += n
+        self._missed_since += n
+
+    def _publish(self, replies, slot: float) -> TelemetrySample:
+        d_resp, l_resp, s_resp = (list(replies) + ["", "", ""])[:3]
+        now = time.monotonic()
+        self._seq += 1
+        s = TelemetrySample(
+            seq=self._seq,
+            slot=slot,
+            mono=now,
+            wall=datetime.fromtimestamp(slot, self.tz),
+            missed=self._missed_since,
+            dtemf=parse_reply_float(d_resp),
+            ltemf=parse_reply_float(l_resp),
+            status=decode_status(s_resp, now),
+            replies=tuple(replies),
+        )
+        self._missed_since = 0
+        self.last = s
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            sub.put(s)
+        return s
+
+    @staticmethod
+    def _next_slot(after: float, period: float) -> float:
+        """First multiple of period strictly after the epoch time after."""
+        k = math.floor(after / period)
+        while k * period <= after + 1e-9:
+            k += 1
+        return k * period
+
+    def run(self) -> None:
+        # wall = monotonic + offset; วัด offset ใหม่ทุกรอบ เผื่อ NTP ปรับนาฬิกา
+        slot = self._next_slot(time.time(), self.current_interval())
+        while not self._stop_ev.is_set():
+            # รอถึง deadline ของ slot (บน monotonic); คาบ/slot ถูกคำนวณใหม่ทุก TICK
+            # เปลี่ยน state กลางทาง (เช่น REST → FIRE) ก็ย้ายไป slot ของคาบใหม่ได้ทันที
+            while not self._stop_ev.is_set():
+                period = self.current_interval()
+                wall = time.time()
+                offset = wall - time.monotonic()
+                slot = min(slot, self._next_slot(wall, period))
+                left = (slot - offset) - time.monotonic()
+                if left <= 0:
+                    break
+                self._stop_ev.wait(min(left, self.TICK))
+            if self._stop_ev.is_set():
+                return
+            try:
+                replies = self._read()
+            except Exception:
+                replies = None
+            if replies is not None:
+                self._publish(replies, slot)
+            else:
+                self._miss(1)
+            # slot ถัดไปที่ยังไม่เลย; ที่เลยไปแล้ว (read/เขียนช้า) นับเป็น missed ไม่ยิงไล่
+            period = self.current_interval()
+            nxt = self._next_slot(slot, period)
+            now = time.time()
+            if nxt <= now:
+                late = self._next_slot(now, period)
+                self._miss(int(round((late - nxt) / period)))
+                nxt = late
+            slot = nxt
@@ -0,0 +1,188 @@
+# telemetry_sink.py
+from __future__ import annotations
+import csv
+import os
+import threading
+import time
+from datetime import datetime
+
+TELEMETRY_HEADER = [
+    "Date", "Time", "Timezone",
+    "STATUS", "QSDELAY", "DTEMF", "LTEMF", "overload", "ROOF_STATUS",
+    # เวลาของ slot บนกริด (epoch s), monotonic ตอนได้คำตอบ, จำนวน slot ที่หายก่อนแถวนี้
+    "EPOCH", "MONO", "MISSED",
+]
+
+
+class _Target:
+    __slots__ = ("f", "writer", "rows")
+
+    def __init__(self, f):
+        self.f = f
+        self.writer = csv.writer(f)
+        self.rows: list[list] = []
+
+
+class CsvSink:
+    """
+    Long-lived CSV writer for the telemetry worker.
+
+    Keeps one open handle per target file and buffers rows; buffered rows are
+    written when flush_rows rows are pending or flush_sec has passed since the
+    last flush. write() only checks the clock when a row arrives, so the owner
+    calls flush_if_due() while idle (e.g. on its queue timeout). Passing a
+    different set of paths to write() (owner program or manual-parallel file
+    changed) flushes, fsyncs and closes the handles that dropped out. close()
+    does the same for everything. A file that already has a different header
+    is not appended to; rows go to path_1 (path_2, ...) instead. Thread-safe.
+    """
+
+    def __init__(self, header=TELEMETRY_HEADER, flush_rows: int = 30, flush_sec: float = 10.0):
+        self.header = list(header)
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_sec = float(flush_sec)
+        self._targets: dict[str, _Target] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _file_for(self, path: str) -> str:
+        """
+        path, or path_1, path_2, ... if path already starts with a different
+        header (e.g. a daily file written before EPOCH/MONO/MISSED were added),
+        so rows never get appended under the wrong columns.
+        """
+        root, ext = os.path.splitext(path)
+        n = 0
+        cand = path
+        while True:
+            try:
+                with open(cand, newline="", encoding="utf-8") as f:
+                    first = next(csv.reader(f), None)
+            except FileNotFoundError:
+                return cand
+            if first is None or first == self.header:
+                return cand
+            n += 1
+            cand = f"{root}_{n}{ext}"
+
+    def _open(self, path: str) -> _Target:
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        f = open(self._file_for(path), "a", newline="", encoding="utf-8")
+        t = _Target(f)
+        if f.tell() == 0:
+            t.writer.writerow(self.header)
+        self._targets[path] = t
+        return t
+
+    def write(self, paths, row) -> None:
+        """Queue row for every path in paths; paths not listed any more are closed."""
+        paths = [p for p in paths if p]
+        with self._lock:
+            for old in [p for p in self._targets if p not in paths]:
+                self._close_one(old)
+            pending = 0
+            for p in paths:
+                t = self._targets.get(p) or self._open(p)
+                t.rows.append(row)
+                pending = max(pending, len(t.rows))
+            if pending >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_sec:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        for t in self._targets.values():
+            if t.rows:
+                t.writer.writerows(t.rows)
+                t.rows.clear()
+            t.f.flush()
+        self._last_flush = time.monotonic()
+
+    def _close_one(self, path: str) -> None:
+        t = self._targets.pop(path)
+        try:
+            if t.rows:
+                t.writer.writerows(t.rows)
+            t.f.flush()
+            os.fsync(t.f.fileno())
+        finally:
+            t.f.close()
+
+    def flush_if_due(self) -> bool:
+        """Flush if rows are pending and flush_sec has passed; True if it flushed."""
+        with self._lock:
+            if time.monotonic() - self._last_flush < self.flush_sec:
+                return False
+            if not any(t.rows for t in self._targets.values()):
+                return False
+            self._flush_locked()
+            return True
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        """Write everything pending, fsync and close all files (the sink stays usable)."""
+        with self._lock:
+            for p in list(self._targets):
+                self._close_one(p)
+
+
+def _float_or_none(s: str) -> float | None:
+    try:
+        return float(s) if s else None
+    except ValueError:
+        return None
+
+
+def tail_rows(path: str, since: float, tz, block: int = 1 << 16) -> list[tuple[float, int | None, float | None, float | None]]:
+    """
+    (epoch, STATUS, DTEMF, LTEMF) of the rows of a telemetry CSV newer than
+    since (epoch s), oldest first. Reads backwards from the end of the file
+    in blocks and stops at the first older row, so only the tail is parsed.
+    Uses EPOCH when the file has it, otherwise Date + Time in tz.
+    """
+    out = []
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8", "replace").strip().split(",")
+        col = {name: i for i, name in enumerate(header)}
+        if not {"Date", "Time", "STATUS", "DTEMF", "LTEMF"} <= col.keys():
+            return out
+        i_ep = col.get("EPOCH")
+        width = len(header)
+        body = f.tell()
+
+        def parse(line: bytes):
+            cells = line.decode("utf-8", "replace").rstrip("\r").split(",")
+            if len(cells) < 7:
+                return None
+            t = _float_or_none(cells[i_ep]) if i_ep is not None and len(cells) == width else None
+            if t is None:
+                try:
+                    t = datetime.strptime(f"{cells[col['Date']]} {cells[col['Time']]}",
+                                          "%Y-%m-%d %H:%M:%S").replace(tzinfo=tz).timestamp()
+                except ValueError:
+                    return None
+            st = _float_or_none(cells[col["STATUS"]])
+            return (t, None if st is None else int(st),
+                    _float_or_none(cells[col["DTEMF"]]), _float_or_none(cells[col["LTEMF"]]))
+
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        rest = b""
+        while pos > body:
+            n = min(block, pos - body)
+            pos -= n
+            f.seek(pos)
+            lines = (f.read(n) + rest).split(b"\n")
+            # บรรทัดแรกของ block อาจขาดครึ่ง → เก็บไว้ต่อกับ block ก่อนหน้า (ยกเว้นถึงต้นไฟล์แล้ว)
+            rest = lines.pop(0) if pos > body else b""
+            for line in reversed(lines):
+                row = parse(line) if line.strip() else None
+                if row is None:
+                    continue
+                if row[0] < since:
+                    return out[::-1]
+                out.append(row)
+    return out[::-1]
@@ -0,0 +1,30 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# โมดูลของแอปอยู่ที่ root ของ repo (ไม่ได้เป็น package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from laser_client import LaserClient  # noqa: E402
+from laser_sim import LaserSimulator, SimConfig  # noqa: E402
+
+
+@pytest.fixture
+def make_link():
+    """make_link(cfg=SimConfig(...), **client_kw) -> (simulator, connected client); both closed after the test."""
+    opened = []
+
+    def make(cfg: SimConfig | None = None, **kw):
+        sim = LaserSimulator("127.0.0.1", 0, cfg=cfg, seed=1).start()
+        kw.setdefault("user", "TEST")
+        client = LaserClient("127.0.0.1", sim.port, **kw)
+        opened.append((sim, client))
+        client.connect()
+        return sim, client
+
+    yield make
+    for sim, client in opened:
+        client.close()
+        sim.stop()
@@ -0,0 +1,87 @@
+# tests/test_laser_client.py
+import threading
+import time
+
+import pytest
+
+from laser_client import PRIO_TELEMETRY, STATE_CONNECTED, StaleCommand, reply_head
+from laser_sim import SimConfig
+
+QUERIES = ("$LTEMF ?", "$DTEMF ?", "$QSDELAY ?", "$DFREQ ?", "$STATUS ?")
+
+
+def test_replies_match_their_command_under_drop_and_split(make_link):
+    # ตอบช้าเกิน timeout บางครั้ง + ไม่ตอบเลย + ตอบเป็น 2 ก้อน → คำตอบต้องไม่ไปตกกับคำสั่งอื่น
+    cfg = SimConfig(latency_ms=20, jitter_ms=20, drop=0.15, split=0.5, split_gap_ms=5)
+    _, client = make_link(cfg, timeout=0.03, max_silent=1000)
+    answered = 0
+    for i in range(150):
+        cmd = QUERIES[i % len(QUERIES)]
+        resp = client.submit(cmd).result(2.0)
+        if resp:
+            answered += 1
+            assert reply_head(resp) == reply_head(cmd), (cmd, resp)
+    assert answered > 0
+    assert client.connected
+
+
+def test_pipelined_replies_keep_their_order_under_split(make_link):
+    _, client = make_link(SimConfig(latency_ms=1, split=1.0, split_gap_ms=2))
+    for _ in range(20):
+        replies = client.submit_many(QUERIES).result(5.0)
+        assert [reply_head(r) for r in replies] == [reply_head(c) for c in QUERIES]
+
+
+def test_reconnects_and_replays_login(make_link):
+    sim, client = make_link(SimConfig(latency_ms=1), backoff_initial=0.05)
+    states = []
+    up = threading.Event()
+
+    def on_state(state, detail):
+        states.append(state)
+        if state == STATE_CONNECTED:
+            up.set()
+    client.add_state_listener(on_state)
+
+    sim.drop_connections()
+    assert up.wait(5.0), states
+    assert client.reconnects == 1
+    # LOGIN ถูกส่งซ้ำหลัง reconnect → $FIRE ไม่โดน "NOT LOGGED IN"
+    assert client.send_cmd("$FIRE").strip() == "$FIRE"
+    assert sim.model.mode == "FIRE"
+
+
+def test_commands_fail_fast_while_link_is_down(make_link):
+    sim, client = make_link(SimConfig(latency_ms=1), backoff_initial=5.0)
+    sim.stop()
+    deadline = time.monotonic() + 5.0
+    while client.connected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not client.connected
+    with pytest.raises(RuntimeError):
+        client.submit("$STATUS ?").result(2.0)
+
+
+def test_dispatcher_drops_stale_commands(make_link):
+    _, client = make_link(SimConfig(latency_ms=200))
+    busy = client.submit("$LTEMF ?")
+    # ต้องรอ exchange ข้างหน้า ~200 ms แต่มี deadline แค่ 50 ms → ทิ้งโดยไม่ส่ง
+    stale = client.submit("$DTEMF ?", priority=PRIO_TELEMETRY, deadline=time.monotonic() + 0.05)
+    with pytest.raises(StaleCommand):
+        stale.result(2.0)
+    assert reply_head(busy.result(2.0)) == "$LTEMF"
+    # งานที่ deadline ยังไม่หมดยังถูกส่งตามปกติ
+    fresh = client.submit("$DTEMF ?", priority=PRIO_TELEMETRY, deadline=time.monotonic() + 1.0)
+    assert reply_head(fresh.result(2.0)) == "$DTEMF"
+
+
+def test_send_at_waits_for_its_time_and_can_be_withdrawn(make_link):
+    sim, client = make_link(SimConfig(latency_ms=1))
+    at = time.monotonic() + 0.2
+    timing = client.send_at("$STANDBY", at).result(2.0)
+    assert timing.sent >= at and timing.reply.strip() == "$STANDBY"
+
+    fut = client.send_at("$FIRE", time.monotonic() + 0.2)
+    fut.cancel()
+    time.sleep(0.3)
+    assert sim.model.mode == "STANDBY"
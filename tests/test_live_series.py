@@ -0,0 +1,54 @@
+# tests/test_live_series.py
+import random
+
+import numpy as np
+import pytest
+
+from live_series import AggSeries, RingSeries
+
+
+def brute_min_max(s: RingSeries):
+    v = s.rows()
+    v = v[np.isfinite(v)]
+    return (float(v.min()), float(v.max())) if v.size else None
+
+
+@pytest.mark.parametrize("window_sec", [None, 7.5])
+def test_ring_min_max_matches_brute_force(window_sec):
+    rng = random.Random(42)
+    s = RingSeries(capacity=20, ncols=2, window_sec=window_sec)
+    assert s.min_max() is None
+    t = 0.0
+    for _ in range(500):
+        t += rng.uniform(0.1, 1.0)
+        a = None if rng.random() < 0.1 else rng.uniform(-50, 50)
+        b = None if rng.random() < 0.1 else rng.uniform(-50, 50)
+        s.append(t, a, b)
+        want = brute_min_max(s)
+        got = s.min_max()
+        if want is None:
+            assert got is None
+        else:
+            assert got == pytest.approx(want, rel=1e-6)
+    assert len(s) <= 20
+    if window_sec is not None:
+        assert s.t[-1] - s.t[0] <= window_sec
+
+
+def test_ring_clear_resets_min_max():
+    s = RingSeries(capacity=4)
+    s.append(0.0, 5.0)
+    s.clear()
+    assert s.min_max() is None and len(s) == 0
+    s.append(1.0, -1.0)
+    assert s.min_max() == (-1.0, -1.0)
+
+
+def test_agg_series_keeps_bucket_min_and_max():
+    a = AggSeries(ncols=1, bucket_sec=10, window_sec=100)
+    for i in range(30):
+        a.add(float(i), float(i % 10))
+    assert len(a) == 6
+    assert list(a.t[:4]) == [0.0, 5.0, 10.0, 15.0]
+    assert list(a.values(0)) == [0.0, 9.0] * 3
+    assert a.min_max() == (0.0, 9.0)
@@ -0,0 +1,65 @@
+# tests/test_telemetry_sink.py
+import os
+from datetime import datetime, timedelta, timezone
+
+from telemetry_sink import TELEMETRY_HEADER, CsvSink, tail_rows
+
+TZ = timezone(timedelta(hours=7))
+OLD_HEADER = TELEMETRY_HEADER[:9]
+T0 = datetime(2026, 1, 1, 12, 0, 0, tzinfo=TZ)
+
+
+def old_row(t: datetime, status: int, dtemf: float, ltemf: float) -> list:
+    return [t.strftime("%Y-%m-%d"), t.strftime("%H:%M:%S"), "UTC+07:00",
+            status, 220, dtemf, ltemf, 0, "OPEN"]
+
+
+def write_csv(path, header, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in [header, *rows]:
+            f.write(",".join(str(c) for c in r) + "\r\n")
+
+
+def test_tail_rows_old_header_uses_date_and_time(tmp_path):
+    p = tmp_path / "telemetry_20260101.csv"
+    write_csv(p, OLD_HEADER, [old_row(T0 + timedelta(seconds=i), i % 2, 40.0, 30.0 + i) for i in range(100)])
+    since = (T0 + timedelta(seconds=90)).timestamp()
+    rows = tail_rows(str(p), since, TZ, block=64)   # block เล็ก → บรรทัดถูกตัดข้าม block
+    assert [r[0] for r in rows] == [(T0 + timedelta(seconds=i)).timestamp() for i in range(90, 100)]
+    assert rows[0][1:] == (0, 40.0, 120.0)
+
+
+def test_tail_rows_new_header_uses_epoch(tmp_path):
+    p = tmp_path / "telemetry_20260101.csv"
+    base = T0.timestamp()
+    rows = []
+    for i in range(50):
+        # EPOCH (เวลา slot บนกริด) ไม่ตรงกับ Date/Time ทุกวินาที → ต้องใช้ EPOCH
+        rows.append(old_row(T0 + timedelta(seconds=2 * i), 1, 40.0, 31.5) + [base + 2 * i + 0.25, 123.4, 0])
+    write_csv(p, TELEMETRY_HEADER, rows)
+    got = tail_rows(str(p), base + 80, TZ)
+    assert [r[0] for r in got] == [base + 2 * i + 0.25 for i in range(40, 50)]
+    assert got[-1][1:] == (1, 40.0, 31.5)
+
+
+def test_tail_rows_skips_files_without_telemetry_columns(tmp_path):
+    p = tmp_path / "timing.csv"
+    write_csv(p, ["a", "b"], [[1, 2]])
+    assert tail_rows(str(p), 0, TZ) == []
+
+
+def test_csv_sink_rolls_over_when_header_differs(tmp_path):
+    p = str(tmp_path / "telemetry_20260101.csv")
+    write_csv(p, OLD_HEADER, [old_row(T0, 0, 40.0, 30.0)])
+    row = old_row(T0, 1, 40.0, 31.0) + [T0.timestamp(), 1.0, 0]
+    for _ in range(2):
+        sink = CsvSink(flush_rows=1)
+        sink.write([p], row)
+        sink.close()
+    with open(p, encoding="utf-8") as f:
+        assert len(f.read().splitlines()) == 2            # ไฟล์เดิมไม่ถูกแตะ
+    rolled = str(tmp_path / "telemetry_20260101_1.csv")
+    with open(rolled, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    assert lines[0].split(",") == TELEMETRY_HEADER and len(lines) == 3
+    assert sorted(os.listdir(tmp_path)) == ["telemetry_20260101.csv", "telemetry_20260101_1.csv"]